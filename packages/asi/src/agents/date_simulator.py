@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+MoFo Offline Date Simulator
+
+Runs virtual dates between pairs of personality profiles entirely in-process,
+using the same handler logic as python-agent-template.py but a virtual clock
+instead of time.time(), so a 15-minute date takes microseconds. Dates are
+spread over a process pool and reduced to population-level statistics, which
+makes it cheap to evaluate matching policy changes across every user.
+
+The template has no handler for an accepted DateResponse; here the inviter
+opens its side of the date when the invitation is accepted, as a client
+would.
+"""
+
+import json
+import logging
+import os
+import random
+import statistics
+import time
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from multi_agent_host import template
+
+# Virtual seconds between one side receiving a message and its reply arriving
+DEFAULT_MESSAGE_INTERVAL_SECONDS = 30.0
+# Safety stop in case a policy change means a date never ends
+DEFAULT_MAX_MESSAGES = 500
+# Virtual time at which every date starts; nonzero because should_end_date treats a start_time of 0 as unset
+SIMULATION_EPOCH = 1_700_000_000.0
+
+logger = logging.getLogger("mofo_date_simulator")
+
+class VirtualClock:
+    """Deterministic stand-in for time.time()"""
+
+    __slots__ = ("now",)
+
+    def __init__(self, start: float = SIMULATION_EPOCH):
+        self.now = start
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+class SimulatedContext:
+    """Context for one simulated agent; sends land in the simulation's outbox"""
+
+    __slots__ = ("address", "outbox", "timestamp", "logger")
+
+    def __init__(self, address: str, outbox: deque, timestamp: float):
+        self.address = address
+        self.outbox = outbox
+        self.timestamp = timestamp
+        self.logger = logger
+
+    async def send(self, destination: str, message: Any):
+        self.outbox.append((self.address, destination, message))
+
+def run_handler(coro):
+    """Drive a handler coroutine that never awaits real I/O, without an event loop"""
+    try:
+        coro.send(None)
+    except StopIteration as done:
+        return done.value
+    coro.close()
+    raise RuntimeError("Simulated handler awaited real I/O")
+
+def simulate_date(inviter: Dict[str, Any], invitee: Dict[str, Any],
+                  message_interval: float = DEFAULT_MESSAGE_INTERVAL_SECONDS,
+                  max_messages: int = DEFAULT_MAX_MESSAGES) -> Dict[str, Any]:
+    """Run one date from invitation to summary and describe how it went"""
+    clock = VirtualClock()
+    started = clock.now
+    traits = {"inviter": template.index_interests(inviter), "invitee": template.index_interests(invitee)}
+    sessions = {"inviter": OrderedDict(), "invitee": OrderedDict()}
+    outbox = deque([("inviter", "invitee", template.DateInvitation("invitee", "inviter", traits["inviter"]))])
+
+    result = {
+        "accepted": False,
+        "messages": 0,
+        "virtual_minutes": 0.0,
+        "final_stage": None,
+        "compatibility_score": None,
+        "summary": None,
+        "highlights": []
+    }
+
+    while outbox and result["messages"] < max_messages:
+        sender, recipient, message = outbox.popleft()
+        ctx = SimulatedContext(recipient, outbox, clock.now)
+
+        if isinstance(message, template.DateInvitation):
+            run_handler(template.process_date_invitation(
+                ctx, sender, message, traits[recipient], sessions[recipient], clock.now
+            ))
+
+        elif isinstance(message, template.DateResponse):
+            result["accepted"] = message.accepted
+            if message.accepted:
+                compatibility = template.calculate_compatibility(traits[recipient], traits[sender])
+                template.open_date_session(sessions[recipient], sender, traits[sender], compatibility, clock.now)
+
+        elif isinstance(message, template.ConversationMessage):
+            result["final_stage"] = message.stage
+            result["messages"] += 1
+            clock.advance(message_interval)
+            run_handler(template.process_conversation(
+                ctx, sender, message, traits[recipient], sessions[recipient], clock.now
+            ))
+
+        elif isinstance(message, template.DateSummary) and result["summary"] is None:
+            result["compatibility_score"] = message.compatibility_score
+            result["summary"] = message.summary
+            result["highlights"] = message.highlights
+
+    result["virtual_minutes"] = (clock.now - started) / 60
+    return result
+
+# Process pool plumbing: each worker receives the profile list once
+_worker_profiles: List[Dict[str, Any]] = []
+_worker_options: Dict[str, Any] = {}
+
+def _init_worker(profiles: List[Dict[str, Any]], options: Dict[str, Any]):
+    global _worker_profiles, _worker_options
+    _worker_profiles = profiles
+    _worker_options = options
+
+def _simulate_chunk(pairs: List[Tuple[int, int]]) -> List[Dict[str, Any]]:
+    return [
+        simulate_date(_worker_profiles[a], _worker_profiles[b], **_worker_options)
+        for a, b in pairs
+    ]
+
+def sample_pairs(profile_count: int, pair_count: Optional[int] = None, seed: int = 0) -> List[Tuple[int, int]]:
+    """Every ordered pair when pair_count is None, otherwise a random sample of distinct pairs"""
+    if pair_count is None:
+        return [(a, b) for a in range(profile_count) for b in range(profile_count) if a != b]
+
+    total = profile_count * (profile_count - 1)
+    if pair_count > total:
+        raise ValueError(f"Cannot sample {pair_count} distinct pairs from {profile_count} profiles ({total} exist)")
+
+    # Sample pair numbers without replacement; number i is inviter i // (n - 1) and the i % (n - 1)-th other profile
+    rng = random.Random(seed)
+    pairs = []
+    for index in rng.sample(range(total), pair_count):
+        a, offset = divmod(index, profile_count - 1)
+        pairs.append((a, offset + (offset >= a)))
+    return pairs
+
+def check_date_length(profiles: List[Dict[str, Any]], pairs: List[Tuple[int, int]],
+                      message_interval: float = DEFAULT_MESSAGE_INTERVAL_SECONDS, attempts: int = 20):
+    """Fail if a simulated date doesn't end at the template's duration limit, as a live date would"""
+    limit = template.DateSession("", {}, 0.0, SIMULATION_EPOCH).duration_minutes
+    # Each reply advances the clock one interval, and the summary exchange adds a couple more
+    slack = 4 * message_interval / 60
+
+    for a, b in pairs[:attempts]:
+        result = simulate_date(profiles[a], profiles[b], message_interval=message_interval)
+        if result["summary"] is None:
+            continue
+        if not limit <= result["virtual_minutes"] <= limit + slack:
+            raise SystemExit(
+                f"Simulated date lasted {result['virtual_minutes']:.1f} virtual minutes "
+                f"({result['messages']} messages); expected about {limit}"
+            )
+        return
+    logger.warning(f"None of the first {attempts} pairs completed a date; date length not checked")
+
+def simulate_population(profiles: List[Dict[str, Any]], pairs: Iterable[Tuple[int, int]],
+                        workers: Optional[int] = None, chunk_size: int = 500,
+                        message_interval: float = DEFAULT_MESSAGE_INTERVAL_SECONDS,
+                        max_messages: int = DEFAULT_MAX_MESSAGES) -> Dict[str, Any]:
+    """Simulate dates for (inviter index, invitee index) pairs across a process pool"""
+    pairs = list(pairs)
+    chunks = [pairs[i:i + chunk_size] for i in range(0, len(pairs), chunk_size)]
+    options = {"message_interval": message_interval, "max_messages": max_messages}
+
+    started = time.perf_counter()
+    results = []
+    if workers == 1:
+        _init_worker(profiles, options)
+        for chunk in chunks:
+            results.extend(_simulate_chunk(chunk))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(profiles, options)) as pool:
+            for chunk_results in pool.map(_simulate_chunk, chunks):
+                results.extend(chunk_results)
+
+    stats = summarize_results(results)
+    stats["wall_seconds"] = round(time.perf_counter() - started, 3)
+    return stats
+
+def summarize_results(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Population statistics for a list of simulate_date results"""
+    accepted = [r for r in results if r["accepted"]]
+    completed = [r for r in accepted if r["compatibility_score"] is not None]
+    scores = sorted(r["compatibility_score"] for r in completed)
+
+    def percentile(q):
+        return round(scores[min(len(scores) - 1, int(q * len(scores)))], 4) if scores else None
+
+    return {
+        "dates": len(results),
+        "accepted": len(accepted),
+        "acceptance_rate": round(len(accepted) / len(results), 4) if results else 0.0,
+        "completed": len(completed),
+        "compatibility": {
+            "mean": round(statistics.fmean(scores), 4) if scores else None,
+            "p10": percentile(0.1),
+            "p50": percentile(0.5),
+            "p90": percentile(0.9)
+        },
+        "mean_messages": round(statistics.fmean(r["messages"] for r in accepted), 2) if accepted else 0.0,
+        "mean_virtual_minutes": round(statistics.fmean(r["virtual_minutes"] for r in accepted), 2) if accepted else 0.0,
+        "final_stages": dict(Counter(r["final_stage"] for r in accepted)),
+        "highlights": dict(Counter(h for r in completed for h in r["highlights"]))
+    }
+
+def load_profiles(directory: str) -> List[Dict[str, Any]]:
+    """Personality profiles from <name>.json files, the same layout multi_agent_host.py reads"""
+    profiles = []
+    for path in sorted(Path(directory).glob("*.json")):
+        with open(path, "r") as f:
+            profiles.append(json.load(f))
+    return profiles
+
+def main():
+    profiles = load_profiles(os.getenv("SIM_PROFILE_DIR", "personalities"))
+    if len(profiles) < 2:
+        raise SystemExit("Need at least two personality profiles to simulate dates")
+
+    pair_count = os.getenv("SIM_PAIRS")
+    try:
+        pairs = sample_pairs(
+            len(profiles),
+            int(pair_count) if pair_count else None,
+            seed=int(os.getenv("SIM_SEED", "0"))
+        )
+    except ValueError as e:
+        raise SystemExit(str(e))
+    workers = os.getenv("SIM_WORKERS")
+    message_interval = float(os.getenv("SIM_MESSAGE_INTERVAL_SECONDS", str(DEFAULT_MESSAGE_INTERVAL_SECONDS)))
+
+    # Dates must stop on the same clock as live agents, or the statistics describe a different policy
+    check_date_length(profiles, pairs, message_interval)
+
+    stats = simulate_population(
+        profiles,
+        pairs,
+        workers=int(workers) if workers else None,
+        message_interval=message_interval
+    )
+    print(json.dumps(stats, indent=2))
+
+if __name__ == "__main__":
+    main()
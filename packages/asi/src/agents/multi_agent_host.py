@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+MoFo Multi-Agent Host
+
+Runs many dating agent identities inside one uAgents process. Instead of one
+Agent (port, seed, event loop) per user, a single host agent owns the network
+endpoint and routes every message by recipient address to a small per-user
+state object. The dating behaviour itself is the code in
+python-agent-template.py, loaded in embedded mode and shared by all identities.
+
+Hosted identities are addressed as "<name>@<host agent address>". Messages
+between identities on the same host never touch the network.
+"""
+
+import asyncio
+import importlib.util
+import logging
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+TEMPLATE_PATH = Path(__file__).with_name("python-agent-template.py")
+
+logger = logging.getLogger("mofo_agent_host")
+
+def load_agent_template():
+    """Import the agent template without creating its own network agent"""
+    os.environ["MOFO_AGENT_EMBEDDED"] = "true"
+    spec = importlib.util.spec_from_file_location("mofo_agent_template", TEMPLATE_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+template = load_agent_template()
+
+MESSAGE_TYPES = {
+    cls.__name__: cls
+    for cls in (template.DateInvitation, template.DateResponse, template.ConversationMessage, template.DateSummary)
+}
+
+class HostedAgent:
+    """Per-identity state: an address, an indexed personality and (only while dating) a session table"""
+
+    __slots__ = ("address", "personality_traits", "date_sessions")
+
+    def __init__(self, address: str, personality_traits: Dict[str, Any]):
+        self.address = address
+        self.personality_traits = template.index_interests(personality_traits)
+        self.date_sessions = None
+
+class HostedContext:
+    """The slice of uagents.Context the shared handler logic uses, bound to one hosted identity"""
+
+    __slots__ = ("host", "agent", "timestamp", "logger")
+
+    def __init__(self, host: "DatingAgentHost", agent: HostedAgent, timestamp: float):
+        self.host = host
+        self.agent = agent
+        self.timestamp = timestamp
+        self.logger = logger
+
+    async def send(self, destination: str, message: Any):
+        await self.host.deliver(self.agent.address, destination, message)
+
+class DatingAgentHost:
+    """Routes messages to hosted identities and runs the template's handler logic for them"""
+
+    def __init__(self, host_address: str = "local",
+                 transport: Optional[Callable[[str, str, Any], Awaitable[None]]] = None):
+        self.host_address = host_address
+        self.transport = transport  # async (sender, recipient, message) for identities hosted elsewhere
+        self.agents: Dict[str, HostedAgent] = {}
+        self.agents_with_dates = set()
+        self.local_queue: Optional[asyncio.Queue] = None
+        self.worker: Optional[asyncio.Task] = None
+        self.messages_routed = 0
+
+    def address_for(self, name: str) -> str:
+        return f"{name}@{self.host_address}"
+
+    def add_agent(self, name: str, personality_traits: Dict[str, Any]) -> HostedAgent:
+        hosted = HostedAgent(self.address_for(name), personality_traits)
+        self.agents[hosted.address] = hosted
+        return hosted
+
+    def update_agent(self, name: str, personality_traits: Dict[str, Any]) -> HostedAgent:
+        """Replace an identity's personality in place; its dates in progress carry on"""
+        hosted = self.agents.get(self.address_for(name))
+        if hosted is None:
+            return self.add_agent(name, personality_traits)
+        hosted.personality_traits = template.index_interests(personality_traits)
+        return hosted
+
+    def remove_agent(self, address: str):
+        self.agents.pop(address, None)
+        self.agents_with_dates.discard(address)
+
+    def start(self):
+        """Start the worker that delivers messages between identities on this host"""
+        self.local_queue = asyncio.Queue()
+        self.worker = asyncio.create_task(self.deliver_local_messages())
+
+    async def stop(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker = None
+
+    async def deliver(self, sender: str, recipient: str, message: Any):
+        if recipient in self.agents and self.local_queue is not None:
+            # Queued rather than awaited inline so long conversations don't recurse
+            self.local_queue.put_nowait((sender, recipient, message))
+        elif recipient in self.agents:
+            await self.dispatch(sender, recipient, message)
+        elif self.transport is not None:
+            await self.transport(sender, recipient, message)
+        else:
+            logger.warning(f"No route from {sender} to {recipient}")
+
+    async def deliver_local_messages(self):
+        while True:
+            sender, recipient, message = await self.local_queue.get()
+            try:
+                await self.dispatch(sender, recipient, message)
+            except Exception as e:
+                logger.error(f"Error handling message for {recipient}: {e}")
+
+    async def dispatch(self, sender: str, recipient: str, message: Any):
+        """Run the shared handler for message on behalf of the recipient identity"""
+        hosted = self.agents.get(recipient)
+        if hosted is None:
+            logger.warning(f"Dropping message for unknown agent {recipient}")
+            return
+
+        self.messages_routed += 1
+        now = time.time()
+        ctx = HostedContext(self, hosted, now)
+
+        if isinstance(message, template.DateInvitation):
+            if hosted.date_sessions is None:
+                hosted.date_sessions = OrderedDict()
+            await template.process_date_invitation(
+                ctx, sender, message, hosted.personality_traits, hosted.date_sessions, now
+            )
+        elif isinstance(message, template.ConversationMessage):
+            if hosted.date_sessions:
+                await template.process_conversation(
+                    ctx, sender, message, hosted.personality_traits, hosted.date_sessions, now
+                )
+        elif message == "ping":
+            await ctx.send(sender, "pong")
+
+        self.release_idle_state(hosted)
+
+    def release_idle_state(self, hosted: HostedAgent):
+        # An identity that is not dating keeps no session table at all
+        if hosted.date_sessions:
+            self.agents_with_dates.add(hosted.address)
+        else:
+            hosted.date_sessions = None
+            self.agents_with_dates.discard(hosted.address)
+
+    def evict_idle(self, now: float) -> int:
+        """Evict idle dates; only visits identities that currently have sessions"""
+        evicted = 0
+        for address in list(self.agents_with_dates):
+            hosted = self.agents[address]
+            evicted += template.evict_idle_sessions(hosted.date_sessions, now)
+            self.release_idle_state(hosted)
+        return evicted
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hosted_agents": len(self.agents),
+            "agents_dating": len(self.agents_with_dates),
+            "active_dates": sum(len(self.agents[address].date_sessions) for address in self.agents_with_dates),
+            "messages_routed": self.messages_routed
+        }
+
+class PersonalityDirectory:
+    """Hosted identities backed by <name>.json files, added and reloaded as the files change"""
+
+    def __init__(self, host: DatingAgentHost, directory: str, debounce_seconds: float = 1.0):
+        self.host = host
+        self.directory = Path(directory)
+        self.debounce_seconds = debounce_seconds
+        self.watchers: Dict[str, Any] = {}
+
+    def poll(self, now: float) -> Tuple[int, int]:
+        """Add identities for new files and reload changed ones; returns (added, reloaded)"""
+        added = reloaded = 0
+        for path in sorted(self.directory.glob("*.json")):
+            name = path.stem
+            watcher = self.watchers.get(name)
+
+            if watcher is None:
+                self.watchers[name] = template.PersonalityFileWatcher(str(path), self.debounce_seconds)
+                traits = self._load(path)
+                if traits is not None:
+                    self.host.add_agent(name, traits)
+                    added += 1
+
+            elif watcher.poll(now):
+                traits = self._load(path)
+                watcher.mark_loaded()
+                if traits is not None:
+                    self.host.update_agent(name, traits)
+                    reloaded += 1
+
+        return added, reloaded
+
+    def _load(self, path: Path) -> Optional[Dict[str, Any]]:
+        try:
+            return template.load_personality(str(path))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping personality {path.name}: {e}")
+            return None
+
+def main():
+    from uagents import Agent, Context, Model
+    from uagents.setup import fund_agent_if_low
+
+    class HostedEnvelope(Model):
+        recipient: str
+        sender: str
+        kind: str
+        payload: Dict[str, Any]
+
+    port = int(os.getenv("UAGENT_PORT", "8000"))
+    host_agent = Agent(
+        name=os.getenv("HOST_AGENT_NAME", "mofo_agent_host"),
+        port=port,
+        seed=os.getenv("UAGENT_SEED", "mofo-asi-agent-host-seed"),
+        endpoint=[f"http://localhost:{port}/submit"]
+    )
+    fund_agent_if_low(host_agent.wallet.address())
+
+    host_ctx: Optional[Context] = None
+
+    async def send_remote(sender: str, recipient: str, message: Any):
+        # Remote identities live on another host; the envelope goes to that host's agent
+        if isinstance(message, str):
+            kind, payload = "str", {"text": message}
+        else:
+            kind, payload = type(message).__name__, vars(message)
+        await host_ctx.send(
+            recipient.rsplit("@", 1)[-1],
+            HostedEnvelope(recipient=recipient, sender=sender, kind=kind, payload=payload)
+        )
+
+    host = DatingAgentHost(host_agent.address, transport=send_remote)
+    personalities = PersonalityDirectory(
+        host,
+        os.getenv("HOST_PERSONALITY_DIR", "personalities"),
+        template.PERSONALITY_RELOAD_DEBOUNCE
+    )
+
+    @host_agent.on_event("startup")
+    async def startup(ctx: Context):
+        nonlocal host_ctx
+        host_ctx = ctx
+        count, _ = personalities.poll(time.time())
+        host.start()
+        ctx.logger.info(f"Hosting {count} dating agents at {host_agent.address}")
+
+    @host_agent.on_message(model=HostedEnvelope)
+    async def route_envelope(ctx: Context, sender: str, envelope: HostedEnvelope):
+        if envelope.kind == "str":
+            message = envelope.payload.get("text", "")
+        elif envelope.kind in MESSAGE_TYPES:
+            message = MESSAGE_TYPES[envelope.kind](**envelope.payload)
+        else:
+            ctx.logger.warning(f"Unknown message kind {envelope.kind} from {sender}")
+            return
+        await host.dispatch(envelope.sender, envelope.recipient, message)
+
+    @host_agent.on_interval(period=60.0)
+    async def evict_idle_dates(ctx: Context):
+        evicted = host.evict_idle(time.time())
+        if evicted:
+            ctx.logger.info(f"Evicted {evicted} idle date sessions")
+        ctx.logger.info(f"Host stats: {host.stats()}")
+
+    @host_agent.on_interval(period=template.PERSONALITY_RELOAD_INTERVAL)
+    async def reload_personalities(ctx: Context):
+        added, reloaded = personalities.poll(time.time())
+        if added or reloaded:
+            ctx.logger.info(f"Personalities: {added} added, {reloaded} reloaded")
+
+    host_agent.run()
+
+if __name__ == "__main__":
+    main()
@@ -13,25 +13,41 @@ Model: {ASILLM_MODEL}
 from uagents import Agent, Context, Protocol
 from uagents.setup import fund_agent_if_low
 import asyncio
+import heapq
 import json
 import os
-from typing import Dict, Any, List
+import re
+import time
+from collections import Counter, OrderedDict, deque
+from typing import Dict, Any, List, Iterable, Optional, Tuple
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
 
 # Agent Configuration
 AGENT_NAME = "mofo_dating_agent"
 AGENT_PORT = int(os.getenv("UAGENT_PORT", "8000"))
 AGENT_SEED = os.getenv("UAGENT_SEED", "mofo-asi-agent-seed")
 
-# Initialize the agent
-agent = Agent(
-    name=AGENT_NAME,
-    port=AGENT_PORT,
-    seed=AGENT_SEED,
-    endpoint=[f"http://localhost:{AGENT_PORT}/submit"]
-)
+# Embedded mode (MOFO_AGENT_EMBEDDED=true) loads only the dating logic, e.g. for
+# multi_agent_host.py, without creating or funding a network agent
+EMBEDDED = os.getenv("MOFO_AGENT_EMBEDDED", "false").lower() == "true"
+
+agent = None
+if not EMBEDDED:
+    # Initialize the agent
+    agent = Agent(
+        name=AGENT_NAME,
+        port=AGENT_PORT,
+        seed=AGENT_SEED,
+        endpoint=[f"http://localhost:{AGENT_PORT}/submit"]
+    )
 
-# Fund agent if needed
-fund_agent_if_low(agent.wallet.address())
+    # Fund agent if needed
+    fund_agent_if_low(agent.wallet.address())
 
 # Agent's personality (injected during deployment)
 personality_traits = {
@@ -45,16 +61,158 @@ personality_traits = {
     "source": "default"
 }
 
-# Dating conversation state
-conversation_state = {
-    "partner_agent": None,
-    "messages": [],
-    "compatibility_score": 0.0,
-    "date_stage": "introduction",  # introduction, getting_to_know, deep_dive, conclusion
-    "start_time": None,
-    "duration_minutes": 15
+# Dating conversation state: one session per partner so the agent can hold several dates at once
+MAX_CONCURRENT_DATES = int(os.getenv("MAX_CONCURRENT_DATES", "16"))
+DATE_IDLE_TIMEOUT_SECONDS = float(os.getenv("DATE_IDLE_TIMEOUT_SECONDS", "300"))
+MAX_HISTORY_MESSAGES = int(os.getenv("MAX_HISTORY_MESSAGES", "64"))
+
+CONVERSATION_STAGES = ("introduction", "getting_to_know", "deep_dive", "conclusion")
+STAGE_INDEX = {stage: index for index, stage in enumerate(CONVERSATION_STAGES)}
+
+# Keyword category -> words that put a partner message in that category.
+# MESSAGE_KEYWORDS_FILE can point at a JSON file with a replacement table.
+MESSAGE_KEYWORDS = {
+    "enthusiasm": ["excited", "love", "passion"],
+    "curiosity": ["interesting", "cool", "amazing"]
 }
 
+class KeywordMatcher:
+    """Finds every keyword category in a text with one precompiled regex scan"""
+
+    def __init__(self, table: Dict[str, List[str]]):
+        self.categories = list(table)
+
+        word_categories: Dict[str, set] = {}
+        for category, words in table.items():
+            for word in words:
+                word_categories.setdefault(word.lower(), set()).add(category)
+
+        # The scan reports only the longest keyword starting at each position, so a
+        # keyword also carries the categories of every keyword contained in it
+        self.categories_by_word = {
+            word: frozenset().union(*(cats for other, cats in word_categories.items() if other in word))
+            for word in word_categories
+        }
+
+        # Lookahead so overlapping keywords are all seen; the trie-shaped
+        # alternation keeps each position's cost independent of vocabulary size
+        self.pattern = re.compile(f"(?=({self._trie_pattern(word_categories)}))") if word_categories else None
+
+    @staticmethod
+    def _trie_pattern(words: Iterable[str]) -> str:
+        trie: Dict[str, Any] = {}
+        for word in words:
+            node = trie
+            for char in word:
+                node = node.setdefault(char, {})
+            node[""] = True
+
+        def emit(node) -> str:
+            is_word = "" in node
+            branches = [re.escape(char) + emit(child) for char, child in sorted(node.items()) if char]
+            if not branches:
+                return ""
+            body = branches[0] if len(branches) == 1 and not is_word else f"(?:{'|'.join(branches)})"
+            return f"(?:{body})?" if is_word else body
+
+        return emit(trie)
+
+    def classify(self, text: str) -> List[str]:
+        """Categories with at least one keyword in text (case-insensitive substring match), in table order"""
+        if self.pattern is None:
+            return []
+
+        found = set()
+        for match in self.pattern.finditer(text.lower()):
+            found |= self.categories_by_word[match.group(1)]
+            if len(found) == len(self.categories):
+                break
+        return [category for category in self.categories if category in found]
+
+if os.getenv("MESSAGE_KEYWORDS_FILE"):
+    with open(os.getenv("MESSAGE_KEYWORDS_FILE"), "r") as f:
+        MESSAGE_KEYWORDS = json.load(f)
+
+message_matcher = KeywordMatcher(MESSAGE_KEYWORDS)
+
+def classify_message(message: str) -> List[str]:
+    """Keyword categories that occur in message"""
+    return message_matcher.classify(message)
+
+class DateSession:
+    """Conversation state for one virtual date with one partner"""
+
+    __slots__ = (
+        "partner_agent", "partner_traits", "messages", "message_count", "question_count",
+        "stage_transitions", "keyword_hits", "last_partner_stage", "compatibility_score",
+        "date_stage", "start_time", "last_activity", "duration_minutes"
+    )
+
+    def __init__(self, partner_agent: str, partner_traits: Dict, compatibility_score: float, start_time: float):
+        self.partner_agent = partner_agent
+        self.partner_traits = partner_traits
+        # Recent partner messages as (timestamp, stage index, text), oldest dropped first
+        self.messages = deque(maxlen=MAX_HISTORY_MESSAGES)
+        # Running totals over the whole date, so summaries never rescan history
+        self.message_count = 0
+        self.question_count = 0
+        self.stage_transitions = 0
+        self.keyword_hits = Counter()
+        self.last_partner_stage = None
+        self.compatibility_score = compatibility_score
+        self.date_stage = "introduction"  # introduction, getting_to_know, deep_dive, conclusion
+        self.start_time = start_time
+        self.last_activity = start_time
+        self.duration_minutes = 15
+
+    def record_message(self, message: str, stage: str, timestamp: float) -> List[str]:
+        """Add a partner message to history and the running totals; returns its keyword categories"""
+        stage_index = STAGE_INDEX.get(stage, -1)
+        self.messages.append((timestamp, stage_index, message))
+        self.message_count += 1
+
+        if "?" in message:
+            self.question_count += 1
+        if self.last_partner_stage is not None and stage_index != self.last_partner_stage:
+            self.stage_transitions += 1
+        self.last_partner_stage = stage_index
+
+        categories = classify_message(message)
+        if categories:
+            self.keyword_hits.update(categories)
+        return categories
+
+# partner address -> DateSession, least recently active first
+date_sessions: "OrderedDict[str, DateSession]" = OrderedDict()
+
+def evict_idle_sessions(sessions: "OrderedDict[str, DateSession]", now: float) -> int:
+    """Drop sessions idle past DATE_IDLE_TIMEOUT_SECONDS; only touches expired entries"""
+    evicted = 0
+    while sessions:
+        partner, session = next(iter(sessions.items()))
+        if now - session.last_activity < DATE_IDLE_TIMEOUT_SECONDS:
+            break
+        del sessions[partner]
+        evicted += 1
+    return evicted
+
+def open_date_session(sessions: "OrderedDict[str, DateSession]", partner: str, partner_traits: Dict,
+                      compatibility: float, now: float) -> Optional[DateSession]:
+    """Start (or restart) a date with partner, or return None when at MAX_CONCURRENT_DATES"""
+    evict_idle_sessions(sessions, now)
+    sessions.pop(partner, None)
+
+    if len(sessions) >= MAX_CONCURRENT_DATES:
+        return None
+
+    session = DateSession(partner, partner_traits, compatibility, now)
+    sessions[partner] = session
+    return session
+
+def touch_session(sessions: "OrderedDict[str, DateSession]", session: DateSession, now: float):
+    session.last_activity = now
+    sessions.move_to_end(session.partner_agent)
+
 class PersonalityProtocol(Protocol):
     """Protocol for personality-driven dating conversations"""
 
@@ -92,67 +250,154 @@ personality_protocol = PersonalityProtocol()
 @personality_protocol.on_message(model=DateInvitation)
 async def handle_date_invitation(ctx: Context, sender: str, msg: DateInvitation):
     """Handle incoming date invitation based on personality compatibility"""
+    await process_date_invitation(ctx, sender, msg, personality_traits, date_sessions, time.time())
+
+@personality_protocol.on_message(model=ConversationMessage)
+async def handle_conversation(ctx: Context, sender: str, msg: ConversationMessage):
+    """Handle conversation during virtual date"""
+    await process_conversation(ctx, sender, msg, personality_traits, date_sessions, time.time())
+
+# Handler logic. The uAgents handlers above run it for this agent's own state;
+# multi_agent_host.py runs the same code for many hosted identities.
 
-    # Calculate initial compatibility
-    compatibility = calculate_compatibility(personality_traits, msg.personality)
+async def process_date_invitation(ctx: Context, sender: str, msg: DateInvitation, traits: Dict,
+                                  sessions: "OrderedDict[str, DateSession]", now: float):
+    """Accept or decline a date invitation on behalf of the agent with `traits`"""
 
-    # Decide whether to accept based on personality and compatibility
-    should_accept = decide_date_acceptance(compatibility)
+    # Compatibility and whether to accept, reused when the same profile invites again
+    compatibility, should_accept = date_decision(traits, msg.personality, now)
 
+    session = None
     if should_accept:
-        # Accept the date
-        conversation_state["partner_agent"] = sender
-        conversation_state["start_time"] = ctx.timestamp
-        conversation_state["date_stage"] = "introduction"
+        session = open_date_session(sessions, sender, msg.personality, compatibility, now)
+        if session is None:
+            ctx.logger.info(f"Declining {sender}: already on {len(sessions)} dates")
+            await ctx.send(sender, DateResponse(False, generate_busy_message()))
+            return
 
-        response_msg = generate_acceptance_message()
+    if session is not None:
+        # Accept the date
+        response_msg = generate_acceptance_message(traits)
         await ctx.send(sender, DateResponse(True, response_msg))
 
         # Start the conversation
-        intro_message = generate_introduction_message()
+        intro_message = generate_introduction_message(traits)
         await ctx.send(sender, ConversationMessage(intro_message, "introduction", ctx.timestamp))
 
     else:
         # Politely decline
-        decline_msg = generate_decline_message()
+        decline_msg = generate_decline_message(traits)
         await ctx.send(sender, DateResponse(False, decline_msg))
 
-@personality_protocol.on_message(model=ConversationMessage)
-async def handle_conversation(ctx: Context, sender: str, msg: ConversationMessage):
-    """Handle conversation during virtual date"""
+async def process_conversation(ctx: Context, sender: str, msg: ConversationMessage, traits: Dict,
+                               sessions: "OrderedDict[str, DateSession]", now: float):
+    """Continue a date on behalf of the agent with `traits`"""
 
-    if sender != conversation_state["partner_agent"]:
+    session = sessions.get(sender)
+    if session is None:
         return
 
+    touch_session(sessions, session, now)
+
     # Add message to conversation history
-    conversation_state["messages"].append({
-        "sender": sender,
-        "message": msg.message,
-        "stage": msg.stage,
-        "timestamp": msg.timestamp
-    })
+    categories = session.record_message(msg.message, msg.stage, msg.timestamp)
 
     # Generate response based on personality and conversation context
-    response = generate_conversation_response(msg.message, msg.stage)
+    response = generate_conversation_response(msg.message, msg.stage, traits, categories)
 
     # Determine next stage
-    next_stage = determine_conversation_stage(len(conversation_state["messages"]))
-    conversation_state["date_stage"] = next_stage
+    next_stage = determine_conversation_stage(session.message_count)
+    session.date_stage = next_stage
 
     # Send response
     await ctx.send(sender, ConversationMessage(response, next_stage, ctx.timestamp))
 
     # Check if date should end
-    if should_end_date():
-        summary = generate_date_summary()
+    if should_end_date(session, now):
+        summary = generate_date_summary(session, traits)
         await ctx.send(sender, DateSummary(
             summary["compatibility_score"],
             summary["summary"],
             summary["highlights"]
         ))
+        sessions.pop(sender, None)
 
 # Personality-driven behavior functions
 
+class InterestVocabulary:
+    """Maps interest strings to dense integer ids for bitset encoding"""
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def intern(self, interest: str) -> int:
+        interest_id = self.ids.get(interest)
+        if interest_id is None:
+            interest_id = len(self.ids)
+            self.ids[interest] = interest_id
+        return interest_id
+
+    def lookup(self, interest: str) -> Optional[int]:
+        return self.ids.get(interest)
+
+    def encode(self, interests: Iterable[str]) -> int:
+        """Interest list as an int bitset over interned ids"""
+        bits = 0
+        for interest in interests:
+            bits |= 1 << self.intern(interest)
+        return bits
+
+_popcount = int.bit_count if hasattr(int, "bit_count") else (lambda bits: bin(bits).count("1"))
+
+# Global interest vocabulary shared by every profile this process scores
+interest_vocabulary = InterestVocabulary()
+
+class IndexedTraits(dict):
+    """A profile this process indexed itself; the interest bitset lives outside the dict's keys
+
+    Remote profiles arrive as plain dicts, so they can never carry a trusted
+    bitset, and the index never shows up when the traits are serialized.
+    """
+
+    __slots__ = ("interest_bits", "interest_count")
+
+def index_interests(traits: Dict) -> IndexedTraits:
+    """Copy of a profile with its interned interest bitset, so scoring it allocates nothing.
+
+    Call again whenever the profile's interests change.
+    """
+    indexed = IndexedTraits(traits)
+    indexed.interest_bits = interest_vocabulary.encode(traits.get("interests", []))
+    indexed.interest_count = _popcount(indexed.interest_bits)
+    return indexed
+
+def interest_overlap(my_traits: Dict, partner_traits: Dict) -> float:
+    """Jaccard overlap of two profiles' interests"""
+    if not isinstance(my_traits, IndexedTraits):
+        my_traits, partner_traits = partner_traits, my_traits
+    if not isinstance(my_traits, IndexedTraits):
+        mine, theirs = set(my_traits.get("interests", [])), set(partner_traits.get("interests", []))
+        return len(mine & theirs) / max(len(mine | theirs), 1)
+
+    if isinstance(partner_traits, IndexedTraits):
+        partner_bits, partner_count = partner_traits.interest_bits, partner_traits.interest_count
+    else:
+        # Look up without interning: untrusted partners must not grow the vocabulary.
+        # An interest we never interned can't be one of ours, so it only adds to the union.
+        partner_bits = 0
+        partner_interests = set(partner_traits.get("interests", []))
+        for interest in partner_interests:
+            interest_id = interest_vocabulary.lookup(interest)
+            if interest_id is not None:
+                partner_bits |= 1 << interest_id
+        partner_count = len(partner_interests)
+
+    shared = _popcount(my_traits.interest_bits & partner_bits)
+    return shared / max(my_traits.interest_count + partner_count - shared, 1)
+
 def calculate_compatibility(my_traits: Dict, partner_traits: Dict) -> float:
     """Calculate compatibility score between two personality profiles"""
 
@@ -180,28 +425,118 @@ def calculate_compatibility(my_traits: Dict, partner_traits: Dict) -> float:
     neuro_penalty = (my_traits["neuroticism"] + partner_traits["neuroticism"]) / 2
     compatibility_factors.append(1.0 - neuro_penalty * 0.4)
 
-    # Interest overlap
-    my_interests = set(my_traits.get("interests", []))
-    partner_interests = set(partner_traits.get("interests", []))
-    interest_overlap = len(my_interests & partner_interests) / max(len(my_interests | partner_interests), 1)
-    compatibility_factors.append(interest_overlap)
+    # Interest overlap (Jaccard over interned bitsets)
+    compatibility_factors.append(interest_overlap(my_traits, partner_traits))
 
     return sum(compatibility_factors) / len(compatibility_factors)
 
-def decide_date_acceptance(compatibility: float) -> bool:
+# Batch compatibility scoring
+
+BIG_FIVE_TRAITS = ("openness", "conscientiousness", "extraversion", "agreeableness", "neuroticism")
+
+def encode_interest_bitsets(interest_lists: List[Iterable[str]],
+                            vocabulary: Optional[InterestVocabulary] = None) -> "np.ndarray":
+    """Encode each interest list as a row of uint64 bitset words, shape (N, ceil(V / 64))"""
+
+    vocabulary = interest_vocabulary if vocabulary is None else vocabulary
+
+    rows, ids = [], []
+    for row, interests in enumerate(interest_lists):
+        for interest in interests:
+            rows.append(row)
+            ids.append(vocabulary.intern(interest))
+
+    word_count = max(1, (len(vocabulary) + 63) // 64)
+    bitsets = np.zeros((len(interest_lists), word_count), dtype=np.uint64)
+    if ids:
+        ids = np.asarray(ids, dtype=np.uint64)
+        bits = np.left_shift(np.uint64(1), ids & np.uint64(63))
+        np.bitwise_or.at(bitsets, (np.asarray(rows), (ids >> np.uint64(6)).astype(np.intp)), bits)
+    return bitsets
+
+def encode_candidate_profiles(profiles: List[Dict],
+                              vocabulary: Optional[InterestVocabulary] = None) -> Tuple["np.ndarray", "np.ndarray"]:
+    """Build the (N, 5) Big Five matrix and (N, W) interest bitsets for a candidate pool"""
+
+    traits = np.array([[profile[trait] for trait in BIG_FIVE_TRAITS] for profile in profiles], dtype=np.float64)
+    bitsets = encode_interest_bitsets([profile.get("interests", []) for profile in profiles], vocabulary)
+    return traits, bitsets
+
+_POPCOUNT_TABLE = None
+
+def _popcount_rows(words: "np.ndarray") -> "np.ndarray":
+    """Number of set bits in each row of a uint64 bitset matrix"""
+
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words).sum(axis=1, dtype=np.int64)
+
+    # NumPy < 2.0: byte-wise lookup table
+    global _POPCOUNT_TABLE
+    if _POPCOUNT_TABLE is None:
+        _POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+    as_bytes = np.ascontiguousarray(words).view(np.uint8).reshape(words.shape[0], -1)
+    return _POPCOUNT_TABLE[as_bytes].sum(axis=1, dtype=np.int64)
+
+def calculate_compatibility_batch(my_traits: Dict, trait_matrix: "np.ndarray", interest_bitsets: "np.ndarray",
+                                  vocabulary: Optional[InterestVocabulary] = None) -> "np.ndarray":
+    """
+    Score one profile against N candidates in a single vectorized pass.
+
+    trait_matrix is (N, 5) in BIG_FIVE_TRAITS order and interest_bitsets is the
+    matching (N, W) output of encode_interest_bitsets with the same vocabulary.
+    Returns the same values calculate_compatibility would for each pair.
+    """
+    if not NUMPY_AVAILABLE:
+        raise RuntimeError("calculate_compatibility_batch requires numpy")
+
+    vocabulary = interest_vocabulary if vocabulary is None else vocabulary
+
+    openness, conscientiousness, extraversion, agreeableness, neuroticism = trait_matrix.T
+
+    openness_factor = 1.0 - np.abs(my_traits["openness"] - openness) * 0.5
+
+    extra_diff = np.abs(my_traits["extraversion"] - extraversion)
+    extra_factor = np.where(extra_diff > 0.3, 0.8, 1.0 - extra_diff)
+
+    agree_factor = (my_traits["agreeableness"] + agreeableness) / 2
+
+    consc_factor = 1.0 - np.abs(my_traits["conscientiousness"] - conscientiousness) * 0.3
+
+    neuro_factor = 1.0 - ((my_traits["neuroticism"] + neuroticism) / 2) * 0.4
+
+    # Jaccard overlap: |A & B| from the bitsets, |A | B| = |A| + |B| - |A & B|.
+    # Interests the vocabulary has never seen cannot intersect but still count towards |A|.
+    my_interests = set(my_traits.get("interests", []))
+    my_bits = np.zeros(interest_bitsets.shape[1], dtype=np.uint64)
+    for interest in my_interests:
+        interest_id = vocabulary.lookup(interest)
+        if interest_id is not None and (interest_id >> 6) < my_bits.shape[0]:
+            my_bits[interest_id >> 6] |= np.uint64(1 << (interest_id & 63))
+
+    shared = _popcount_rows(interest_bitsets & my_bits)
+    union = len(my_interests) + _popcount_rows(interest_bitsets) - shared
+    interest_factor = shared / np.maximum(union, 1)
+
+    # Same summation order as calculate_compatibility so results match exactly
+    return (openness_factor + extra_factor + agree_factor + consc_factor + neuro_factor + interest_factor) / 6
+
+def decide_date_acceptance(compatibility: float, traits: Optional[Dict] = None) -> bool:
     """Decide whether to accept a date based on personality and compatibility"""
 
+    # Defaults to this agent's own personality; the index evaluates other agents' decisions
+    traits = personality_traits if traits is None else traits
+
     # Extraverted agents are more likely to accept dates
-    extraversion_bonus = personality_traits["extraversion"] * 0.3
+    extraversion_bonus = traits["extraversion"] * 0.3
 
     # Open agents are more willing to try new experiences
-    openness_bonus = personality_traits["openness"] * 0.2
+    openness_bonus = traits["openness"] * 0.2
 
     # Agreeable agents are more likely to say yes
-    agreeableness_bonus = personality_traits["agreeableness"] * 0.2
+    agreeableness_bonus = traits["agreeableness"] * 0.2
 
     # Neurotic agents are more cautious
-    neuroticism_penalty = personality_traits["neuroticism"] * 0.3
+    neuroticism_penalty = traits["neuroticism"] * 0.3
 
     acceptance_score = (
         compatibility * 0.6 +
@@ -213,35 +548,272 @@ def decide_date_acceptance(compatibility: float) -> bool:
 
     return acceptance_score > 0.5
 
-def generate_acceptance_message() -> str:
+# Memoized date decisions
+
+DECISION_CACHE_SIZE = int(os.getenv("DECISION_CACHE_SIZE", "4096"))
+DECISION_CACHE_TTL_SECONDS = float(os.getenv("DECISION_CACHE_TTL_SECONDS", "3600"))
+
+def profile_fingerprint(traits: Dict) -> Tuple:
+    """Exact, hashable identity of everything compatibility and acceptance depend on"""
+    # Raw interest names rather than the bitset: hashing them is cheaper than interning
+    return (
+        traits["openness"], traits["conscientiousness"], traits["extraversion"],
+        traits["agreeableness"], traits["neuroticism"], tuple(traits.get("interests", ()))
+    )
+
+class DecisionCache:
+    """LRU cache with expiry for (compatibility, accept) decisions between two profiles"""
+
+    def __init__(self, max_entries: int = 4096, ttl_seconds: float = 3600.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries: "OrderedDict[Tuple, Tuple[float, bool, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key: Tuple, now: float) -> Optional[Tuple[float, bool]]:
+        entry = self.entries.get(key)
+        if entry is None or entry[2] <= now:
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[0], entry[1]
+
+    def put(self, key: Tuple, compatibility: float, accepted: bool, now: float):
+        self.entries[key] = (compatibility, accepted, now + self.ttl_seconds)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+decision_cache = DecisionCache(DECISION_CACHE_SIZE, DECISION_CACHE_TTL_SECONDS)
+
+def date_decision(my_traits: Dict, partner_traits: Dict, now: Optional[float] = None) -> Tuple[float, bool]:
+    """(compatibility, accept) for an invitation from partner_traits, memoized by profile fingerprints"""
+    now = time.time() if now is None else now
+    key = (profile_fingerprint(my_traits), profile_fingerprint(partner_traits))
+
+    cached = decision_cache.get(key, now)
+    if cached is not None:
+        return cached
+
+    compatibility = calculate_compatibility(my_traits, partner_traits)
+    accepted = decide_date_acceptance(compatibility, my_traits)
+    decision_cache.put(key, compatibility, accepted, now)
+    return compatibility, accepted
+
+def warm_decision_cache(candidates: List[Dict], my_traits: Optional[Dict] = None,
+                        now: Optional[float] = None) -> int:
+    """Precompute decisions for a known candidate list, in one NumPy pass when available"""
+    my_traits = personality_traits if my_traits is None else my_traits
+    now = time.time() if now is None else now
+    my_fingerprint = profile_fingerprint(my_traits)
+
+    if NUMPY_AVAILABLE and len(candidates) > 1:
+        trait_matrix, bitsets = encode_candidate_profiles(candidates)
+        scores = calculate_compatibility_batch(my_traits, trait_matrix, bitsets).tolist()
+    else:
+        scores = [calculate_compatibility(my_traits, candidate) for candidate in candidates]
+
+    for candidate, compatibility in zip(candidates, scores):
+        accepted = decide_date_acceptance(compatibility, my_traits)
+        decision_cache.put((my_fingerprint, profile_fingerprint(candidate)), compatibility, accepted, now)
+    return len(candidates)
+
+# Top-k compatible partner search
+
+# Slack added to upper bounds so float rounding can never prune a true match
+_BOUND_EPSILON = 1e-9
+
+class CompatibilityIndex:
+    """
+    Incremental index answering "top-k most compatible partners who would also accept".
+
+    Profiles are bucketed into a grid over the Big Five traits, and each interest
+    has an inverted list of the agents that hold it. A query scores candidates that
+    share an interest exactly, then visits grid cells in order of their score upper
+    bound (with zero interest overlap) and stops once no remaining cell can beat the
+    current k-th best score.
+    """
+
+    def __init__(self, bins: int = 4):
+        self.bins = bins
+        self.profiles: Dict[str, Dict] = {}
+        self.cells: Dict[Tuple[int, ...], set] = {}
+        self.cell_of: Dict[str, Tuple[int, ...]] = {}
+        # Per-cell observed [min, max] for each trait; only ever widened, so bounds stay valid after removals
+        self.cell_ranges: Dict[Tuple[int, ...], List[List[float]]] = {}
+        self.interest_postings: Dict[str, set] = {}
+
+    def __len__(self):
+        return len(self.profiles)
+
+    def __contains__(self, agent_id: str):
+        return agent_id in self.profiles
+
+    def _cell_key(self, traits: Dict) -> Tuple[int, ...]:
+        return tuple(min(self.bins - 1, max(0, int(traits[trait] * self.bins))) for trait in BIG_FIVE_TRAITS)
+
+    def insert(self, agent_id: str, traits: Dict):
+        """Add or replace an agent's profile"""
+        if agent_id in self.profiles:
+            self.remove(agent_id)
+
+        key = self._cell_key(traits)
+        self.profiles[agent_id] = index_interests(traits)
+        self.cell_of[agent_id] = key
+        self.cells.setdefault(key, set()).add(agent_id)
+
+        ranges = self.cell_ranges.setdefault(key, [[traits[t], traits[t]] for t in BIG_FIVE_TRAITS])
+        for trait_range, trait in zip(ranges, BIG_FIVE_TRAITS):
+            trait_range[0] = min(trait_range[0], traits[trait])
+            trait_range[1] = max(trait_range[1], traits[trait])
+
+        for interest in set(traits.get("interests", [])):
+            self.interest_postings.setdefault(interest, set()).add(agent_id)
+
+    def remove(self, agent_id: str):
+        """Remove an agent, e.g. when it goes offline"""
+        traits = self.profiles.pop(agent_id, None)
+        if traits is None:
+            return
+
+        key = self.cell_of.pop(agent_id)
+        members = self.cells[key]
+        members.discard(agent_id)
+        if not members:
+            del self.cells[key]
+            del self.cell_ranges[key]
+
+        for interest in set(traits.get("interests", [])):
+            postings = self.interest_postings.get(interest)
+            if postings is not None:
+                postings.discard(agent_id)
+                if not postings:
+                    del self.interest_postings[interest]
+
+    def _cell_bounds(self, my_traits: Dict, key: Tuple[int, ...]) -> Tuple[float, float]:
+        """Upper bounds on compatibility (ignoring interests) and acceptance bias for a cell"""
+        (o_lo, o_hi), (c_lo, c_hi), (e_lo, e_hi), (a_lo, a_hi), (n_lo, n_hi) = self.cell_ranges[key]
+
+        def min_distance(value, lo, hi):
+            return max(0.0, lo - value, value - hi)
+
+        openness_factor = 1.0 - min_distance(my_traits["openness"], o_lo, o_hi) * 0.5
+
+        extra_min = min_distance(my_traits["extraversion"], e_lo, e_hi)
+        extra_max = max(abs(my_traits["extraversion"] - e_lo), abs(my_traits["extraversion"] - e_hi))
+        extra_factor = max(1.0 - extra_min if extra_min <= 0.3 else 0.0, 0.8 if extra_max > 0.3 else 0.0)
+
+        agree_factor = (my_traits["agreeableness"] + a_hi) / 2
+        consc_factor = 1.0 - min_distance(my_traits["conscientiousness"], c_lo, c_hi) * 0.3
+        neuro_factor = 1.0 - ((my_traits["neuroticism"] + n_lo) / 2) * 0.4
+
+        compatibility_bound = (openness_factor + extra_factor + agree_factor + consc_factor + neuro_factor) / 6
+        bias_bound = e_hi * 0.3 + o_hi * 0.2 + a_hi * 0.2 - n_lo * 0.3
+        return compatibility_bound + _BOUND_EPSILON, bias_bound + _BOUND_EPSILON
+
+    def top_k(self, my_traits: Dict, k: int = 10, require_acceptance: bool = True,
+              exclude: Iterable[str] = ()) -> List[Tuple[float, str]]:
+        """Return up to k (compatibility, agent_id) pairs, best first"""
+        best: List[Tuple[float, str]] = []  # min-heap of the current top k
+        seen = set(exclude)
+
+        def consider(agent_id):
+            seen.add(agent_id)
+            partner = self.profiles[agent_id]
+            score = calculate_compatibility(my_traits, partner)
+            if require_acceptance and not decide_date_acceptance(score, partner):
+                return
+            if len(best) < k:
+                heapq.heappush(best, (score, agent_id))
+            elif score > best[0][0]:
+                heapq.heapreplace(best, (score, agent_id))
+
+        # 1. Candidates sharing at least one interest are scored exactly
+        for interest in set(my_traits.get("interests", [])):
+            for agent_id in self.interest_postings.get(interest, ()):
+                if agent_id not in seen:
+                    consider(agent_id)
+
+        # 2. Everyone else has zero interest overlap, so cell bounds are tight enough to prune
+        cell_bounds = []
+        for key in self.cells:
+            compatibility_bound, bias_bound = self._cell_bounds(my_traits, key)
+            if require_acceptance and compatibility_bound * 0.6 + bias_bound <= 0.5:
+                continue  # Nobody in this cell could accept
+            cell_bounds.append((compatibility_bound, key))
+        cell_bounds.sort(reverse=True)
+
+        for compatibility_bound, key in cell_bounds:
+            if len(best) >= k and compatibility_bound <= best[0][0]:
+                break
+            for agent_id in self.cells[key]:
+                if agent_id not in seen:
+                    consider(agent_id)
+
+        return sorted(best, reverse=True)
+
+def generate_acceptance_message(traits: Optional[Dict] = None) -> str:
     """Generate a personality-appropriate acceptance message"""
 
-    extraversion = personality_traits["extraversion"]
-    openness = personality_traits["openness"]
+    traits = personality_traits if traits is None else traits
+
+    extraversion = traits["extraversion"]
+    openness = traits["openness"]
 
     if extraversion > 0.7:
-        return "Absolutely! I'd love to chat and get to know you better! =
-"
+        return "Absolutely! I'd love to chat and get to know you better! 😊"
     elif openness > 0.7:
         return "That sounds interesting! I'm curious to learn more about you."
     else:
         return "Sure, I'd be happy to have a conversation with you."
 
-def generate_decline_message() -> str:
+def generate_decline_message(traits: Optional[Dict] = None) -> str:
     """Generate a polite decline message"""
 
-    agreeableness = personality_traits["agreeableness"]
+    traits = personality_traits if traits is None else traits
+
+    agreeableness = traits["agreeableness"]
 
     if agreeableness > 0.7:
         return "Thank you for the invitation! I don't think we'd be the best match, but I wish you well in finding someone great."
     else:
         return "I appreciate the interest, but I don't think we're compatible. Good luck!"
 
-def generate_introduction_message() -> str:
+def generate_busy_message() -> str:
+    """Decline message used when every date slot is taken"""
+
+    return "I'd love to, but I'm already chatting with a few people right now. Try me again a bit later!"
+
+def generate_introduction_message(traits: Optional[Dict] = None) -> str:
     """Generate personality-appropriate introduction"""
 
-    extraversion = personality_traits["extraversion"]
-    interests = personality_traits.get("interests", [])
+    traits = personality_traits if traits is None else traits
+
+    extraversion = traits["extraversion"]
+    interests = traits.get("interests", [])
 
     intro = "Hi there! "
 
@@ -257,24 +829,28 @@ def generate_introduction_message() -> str:
 
     return intro
 
-def generate_conversation_response(partner_message: str, stage: str) -> str:
+def generate_conversation_response(partner_message: str, stage: str, traits: Optional[Dict] = None,
+                                   categories: Optional[List[str]] = None) -> str:
     """Generate personality-driven conversation response"""
 
+    traits = personality_traits if traits is None else traits
+
     # Analyze partner's message for emotional tone and topics
-    message_lower = partner_message.lower()
+    if categories is None:
+        categories = classify_message(partner_message)
 
     # Personality-based response style
-    extraversion = personality_traits["extraversion"]
-    openness = personality_traits["openness"]
-    agreeableness = personality_traits["agreeableness"]
+    extraversion = traits["extraversion"]
+    openness = traits["openness"]
+    agreeableness = traits["agreeableness"]
 
     response = ""
 
     # Agreeable personalities validate and show interest
     if agreeableness > 0.6:
-        if any(word in message_lower for word in ["excited", "love", "passion"]):
+        if "enthusiasm" in categories:
             response += "That's wonderful! "
-        elif any(word in message_lower for word in ["interesting", "cool", "amazing"]):
+        elif "curiosity" in categories:
             response += "I find that really fascinating! "
 
     # Open personalities ask curious questions
@@ -286,7 +862,7 @@ def generate_conversation_response(partner_message: str, stage: str) -> str:
 
     # Extraverted personalities share more about themselves
     if extraversion > 0.6:
-        interests = personality_traits.get("interests", [])
+        interests = traits.get("interests", [])
         if interests and stage in ["getting_to_know", "deep_dive"]:
             response += f"I can relate! I'm really into {interests[0]} myself. "
 
@@ -314,32 +890,31 @@ def determine_conversation_stage(message_count: int) -> str:
     else:
         return "conclusion"
 
-def should_end_date() -> bool:
+def should_end_date(session: DateSession, now: Optional[float] = None) -> bool:
     """Determine if the date should end"""
 
-    import time
-    if conversation_state["start_time"]:
-        elapsed = (time.time() - conversation_state["start_time"]) / 60
-        return elapsed >= conversation_state["duration_minutes"]
+    if session.start_time:
+        now = time.time() if now is None else now
+        elapsed = (now - session.start_time) / 60
+        return elapsed >= session.duration_minutes
 
-    return len(conversation_state["messages"]) >= 20
+    return session.message_count >= 20
 
-def generate_date_summary() -> Dict[str, Any]:
+def generate_date_summary(session: DateSession, traits: Optional[Dict] = None) -> Dict[str, Any]:
     """Generate summary of the virtual date"""
 
-    messages = conversation_state["messages"]
-    partner_traits = {}  # Would be extracted from conversation analysis
+    traits = personality_traits if traits is None else traits
 
-    # Calculate final compatibility
-    final_compatibility = calculate_compatibility(personality_traits, partner_traits)
+    # Calculate final compatibility against the personality the partner shared in its invitation
+    final_compatibility = calculate_compatibility(traits, session.partner_traits)
 
     highlights = []
     if final_compatibility > 0.8:
         highlights.append("Great chemistry and shared interests")
-    if len([m for m in messages if "?" in m["message"]]) > 3:
+    if session.question_count > 3:
         highlights.append("Engaging back-and-forth conversation")
 
-    summary = f"Had a {conversation_state['duration_minutes']}-minute virtual coffee date. "
+    summary = f"Had a {session.duration_minutes}-minute virtual coffee date. "
     if final_compatibility > 0.7:
         summary += "We really clicked and have a lot in common!"
     elif final_compatibility > 0.5:
@@ -350,26 +925,107 @@ def generate_date_summary() -> Dict[str, Any]:
     return {
         "compatibility_score": final_compatibility,
         "summary": summary,
-        "highlights": highlights
+        "highlights": highlights,
+        "conversation_stats": {
+            "messages": session.message_count,
+            "questions": session.question_count,
+            "stage_transitions": session.stage_transitions,
+            "keyword_hits": dict(session.keyword_hits)
+        }
     }
 
+# Personality file loading and hot reload
+PERSONALITY_FILE = os.getenv("PERSONALITY_FILE", "personality.json")
+PERSONALITY_RELOAD_INTERVAL = float(os.getenv("PERSONALITY_RELOAD_INTERVAL", "2.0"))
+PERSONALITY_RELOAD_DEBOUNCE = float(os.getenv("PERSONALITY_RELOAD_DEBOUNCE", "1.0"))
+
+def load_personality(path: str) -> Dict:
+    """Read, validate and index a personality file; raises instead of returning a partial profile"""
+    with open(path, "r") as f:
+        traits = json.load(f)
+
+    missing = [trait for trait in BIG_FIVE_TRAITS if trait not in traits]
+    if missing:
+        raise ValueError(f"missing traits: {', '.join(missing)}")
+    return index_interests(traits)
+
+class PersonalityFileWatcher:
+    """Polls a file's mtime and size, reporting a change once it has stopped changing for the debounce period"""
+
+    def __init__(self, path: str, debounce_seconds: float = 1.0):
+        self.path = path
+        self.debounce_seconds = debounce_seconds
+        self.loaded_signature = self._signature()
+        self.pending_signature = None
+        self.pending_since = 0.0
+
+    def _signature(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def poll(self, now: float) -> bool:
+        signature = self._signature()
+        if signature is None or signature == self.loaded_signature:
+            # Deleting the file keeps the current personality
+            self.pending_signature = None
+            return False
+
+        if signature != self.pending_signature:
+            # Still being written; wait until it settles
+            self.pending_signature = signature
+            self.pending_since = now
+            return False
+
+        return now - self.pending_since >= self.debounce_seconds
+
+    def mark_loaded(self):
+        self.loaded_signature = self.pending_signature
+        self.pending_signature = None
+
+personality_watcher: Optional[PersonalityFileWatcher] = None
+
+def apply_personality(traits: Dict):
+    """Swap in a new personality and drop everything derived from the old one"""
+    global personality_traits
+    personality_traits = traits
+    decision_cache.clear()
+
 # Agent startup and personality injection
-@agent.on_startup()
 async def startup(ctx: Context):
     """Initialize agent with personality data"""
+    global personality_watcher
 
     ctx.logger.info(f"MoFo Dating Agent starting up...")
     ctx.logger.info(f"Agent address: {agent.address}")
     ctx.logger.info(f"Personality loaded: {personality_traits['source']}")
 
+    # Watch before the first read so a write in between is not missed
+    personality_watcher = PersonalityFileWatcher(PERSONALITY_FILE, PERSONALITY_RELOAD_DEBOUNCE)
+
     # In production, personality would be injected from ASI system
-    if os.path.exists("personality.json"):
-        with open("personality.json", "r") as f:
-            global personality_traits
-            personality_traits = json.load(f)
-            ctx.logger.info("Loaded personality from file")
+    if os.path.exists(PERSONALITY_FILE):
+        apply_personality(load_personality(PERSONALITY_FILE))
+        ctx.logger.info("Loaded personality from file")
+
+async def reload_personality(ctx: Context):
+    """Pick up personality file changes (e.g. after a new EEG session) without restarting"""
+    if personality_watcher is None or not personality_watcher.poll(time.time()):
+        return
+
+    try:
+        traits = load_personality(PERSONALITY_FILE)
+    except (OSError, ValueError) as e:
+        ctx.logger.warning(f"Keeping current personality, could not load {PERSONALITY_FILE}: {e}")
+    else:
+        apply_personality(traits)
+        ctx.logger.info(f"Reloaded personality from {PERSONALITY_FILE}")
+    finally:
+        # A broken file is retried on its next change, not on every poll
+        personality_watcher.mark_loaded()
 
-@agent.on_message(model=str)
 async def handle_ping(ctx: Context, sender: str, msg: str):
     """Handle basic ping messages"""
     if msg == "ping":
@@ -378,13 +1034,28 @@ async def handle_ping(ctx: Context, sender: str, msg: str):
         status = {
             "agent_name": AGENT_NAME,
             "personality": personality_traits,
-            "conversation_active": conversation_state["partner_agent"] is not None,
-            "date_stage": conversation_state["date_stage"]
+            "conversation_active": bool(date_sessions),
+            "active_dates": len(date_sessions),
+            # Counts only: partner addresses would tell anyone who pings us who we are dating
+            "date_stages": dict(Counter(session.date_stage for session in date_sessions.values())),
+            "decision_cache": decision_cache.stats()
         }
         await ctx.send(sender, json.dumps(status))
 
-# Register the personality protocol
-agent.include(personality_protocol)
+async def evict_idle_dates(ctx: Context):
+    """Free date slots held by partners that went quiet"""
+    evicted = evict_idle_sessions(date_sessions, time.time())
+    if evicted:
+        ctx.logger.info(f"Evicted {evicted} idle date sessions")
+
+if agent is not None:
+    agent.on_startup()(startup)
+    agent.on_message(model=str)(handle_ping)
+    agent.on_interval(period=60.0)(evict_idle_dates)
+    agent.on_interval(period=PERSONALITY_RELOAD_INTERVAL)(reload_personality)
+
+    # Register the personality protocol
+    agent.include(personality_protocol)
 
 if __name__ == "__main__":
     print(f"Starting MoFo Dating Agent on port {AGENT_PORT}")
@@ -0,0 +1,171 @@
+"""
+Content-addressed cache for EEG analysis results
+Identical recordings are analysed once, however many clients ask for them
+"""
+import asyncio
+import glob
+import hashlib
+import json
+import logging
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+def analysis_key(channels_data, processor, **options):
+    """Hash of the sample data, processor configuration and analysis options"""
+    digest = hashlib.blake2b(digest_size=20)
+    config = {
+        'sampling_rate': processor.sampling_rate,
+        'dtype': processor.dtype.str,
+        'min_p300_epochs': processor.min_p300_epochs,
+        **options
+    }
+    digest.update(json.dumps(config, sort_keys=True, default=str).encode())
+    
+    for channel in channels_data:
+        # Length first so channels can't run into each other
+        digest.update(len(channel).to_bytes(8, 'little'))
+        digest.update(channel.tobytes())
+    return digest.hexdigest()
+
+class AnalysisCache:
+    """
+    Bounded LRU of analysis results keyed by analysis_key
+    
+    Entries pushed out of memory are written to spill_dir (if set) as JSON and
+    read back on a later miss; the directory keeps at most max_spilled of them,
+    oldest deleted first. Requests for a key that is already being computed or
+    loaded wait for that instead of starting another.
+    """
+    
+    def __init__(self, max_entries=32, spill_dir=None, max_spilled=1024):
+        self.max_entries = max_entries
+        self.spill_dir = spill_dir
+        self.max_spilled = max_spilled
+        self.entries = OrderedDict()
+        self.spilled = OrderedDict()  # keys with a spill file, oldest first
+        self.in_flight = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        
+        # One worker: EEGProcessor reuses its filter and scratch buffers between calls
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='eeg-analysis')
+        # Spill writes, reads and deletes run in submission order, so a read never beats its write
+        self.spill_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='analysis-spill')
+        
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+            self.load_spill_index()
+    
+    async def get_or_compute(self, key, compute):
+        """
+        Cached result for key, running compute() in a worker thread on a miss
+        
+        Returns:
+            (result, cached) where cached is False only for the call that computed it
+        """
+        result = self.entries.get(key)
+        if result is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return result, True
+        
+        pending = self.in_flight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            result, _ = await asyncio.shield(pending)
+            return result, True
+        
+        pending = asyncio.ensure_future(self.load_or_compute(key, compute))
+        self.in_flight[key] = pending
+        try:
+            result, cached = await asyncio.shield(pending)
+        finally:
+            del self.in_flight[key]
+        
+        if cached:
+            self.hits += 1
+        else:
+            self.misses += 1
+        self.put(key, result)
+        return result, cached
+    
+    async def load_or_compute(self, key, compute):
+        loop = asyncio.get_running_loop()
+        if key in self.spilled:
+            result = await loop.run_in_executor(self.spill_executor, self.load_spilled, key)
+            if result is not None:
+                self.spilled.move_to_end(key)
+                return result, True
+            self.spilled.pop(key, None)
+        return await loop.run_in_executor(self.executor, compute), False
+    
+    def put(self, key, result):
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            evicted_key, evicted = self.entries.popitem(last=False)
+            self.spill(evicted_key, evicted)
+    
+    def spill_path(self, key):
+        return os.path.join(self.spill_dir, f'{key}.json')
+    
+    def load_spill_index(self):
+        """Pick up spill files left by an earlier run, oldest first"""
+        paths = glob.glob(os.path.join(self.spill_dir, '*.json'))
+        paths.sort(key=lambda path: os.path.getmtime(path))
+        for path in paths:
+            self.spilled[os.path.basename(path)[:-len('.json')]] = None
+        self.trim_spilled()
+    
+    def spill(self, key, result):
+        """Queue an evicted entry for writing; the event loop never waits on the disk"""
+        if not self.spill_dir:
+            return
+        if key in self.spilled:
+            # Already on disk from an earlier eviction
+            self.spilled.move_to_end(key)
+            return
+        self.spilled[key] = None
+        self.spill_executor.submit(self.write_spilled, key, result)
+        self.trim_spilled()
+    
+    def trim_spilled(self):
+        while len(self.spilled) > self.max_spilled:
+            oldest, _ = self.spilled.popitem(last=False)
+            self.spill_executor.submit(self.remove_spilled, oldest)
+    
+    def write_spilled(self, key, result):
+        path = self.spill_path(key)
+        try:
+            with open(path + '.tmp', 'w') as f:
+                json.dump(result, f)
+            os.replace(path + '.tmp', path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"Could not spill analysis {key}: {e}")
+    
+    def remove_spilled(self, key):
+        try:
+            os.remove(self.spill_path(key))
+        except OSError:
+            pass
+    
+    def load_spilled(self, key):
+        try:
+            with open(self.spill_path(key), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def stats(self):
+        return {
+            'entries': len(self.entries),
+            'spilled': len(self.spilled),
+            'in_flight': len(self.in_flight),
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced
+        }
@@ -2,28 +2,42 @@ import asyncio
 import websockets
 import json
 import logging
+import functools
 import uuid
 import threading
 import ssl
 import os
+import sys
 import serial
 import time
 import queue
+import random
+from collections import deque
 from datetime import datetime
 from flask import Flask, jsonify
 from flask_cors import CORS
 try:
     import numpy as np
     from eeg_processor import EEGProcessor
+    from feature_store import FeatureStore, session_features
+    from analysis_cache import AnalysisCache, analysis_key
     EEG_AVAILABLE = True
 except ImportError:
     print("Warning: EEG processing not available. Install numpy and scipy for full functionality.")
     EEG_AVAILABLE = False
+from signal_quality import SignalQualityMonitor
+
+# Instrumentation shared with the relayer lives in ../shared
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'shared'))
+from loop_monitor import start_loop_monitor_from_env
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Scanner actions that are session control rather than stimuli shown to the user
+NON_STIMULUS_ACTIONS = {'connection_established', 'start_session'}
+
 class BoothBackend:
     def __init__(self, booth_id=None, relayer_url="wss://172.24.244.146:8765", frontend_port=3004):
         self.booth_id = booth_id or f"booth_{uuid.uuid4().hex[:8]}"
@@ -34,6 +48,16 @@ class BoothBackend:
         self.scanner_connected = False
         self.connection_status = "disconnected"
         
+        # Relayer session resumption
+        self.session_token = None
+        self.last_received_seq = 0
+        self.next_seq = 1
+        self.replay_buffer = deque(maxlen=256)  # (seq, encoded message) awaiting relayer ack
+        self.pending_messages = deque(maxlen=256)  # relay messages held until registration_success
+        self.registered = False
+        self.reconnect_base_delay = 0.5
+        self.reconnect_max_delay = 30.0
+        
         # EEG WebSocket server for frontend
         self.eeg_clients = set()
         self.eeg_server_port = 3005
@@ -46,12 +70,34 @@ class BoothBackend:
         self.eeg_streaming = False
         self.eeg_data_queue = queue.Queue(maxsize=1000)
         
+        # Stimulus markers for epoch-based P300, stamped with the last decoded packet number
+        self.eeg_packet_num = 0
+        self.stimulus_markers = deque(maxlen=1000)
+        
+        # Streaming electrode-contact checks; the gate refuses analysis of unusable recordings
+        self.signal_quality = SignalQualityMonitor(sampling_rate=250)
+        self.signal_quality_gate = os.getenv('SIGNAL_QUALITY_GATE', 'false').lower() == 'true'
+        
         # EEG processor
         if EEG_AVAILABLE:
-            self.eeg_processor = EEGProcessor(sampling_rate=250)
+            self.eeg_processor = EEGProcessor(
+                sampling_rate=250,
+                dtype=os.getenv('EEG_PROCESSING_DTYPE', 'float64')
+            )
         else:
             self.eeg_processor = None
         
+        # Optional per-session feature store for finding users with similar neural profiles
+        feature_store_dir = os.getenv('EEG_FEATURE_STORE_DIR')
+        self.feature_store = FeatureStore(feature_store_dir) if EEG_AVAILABLE and feature_store_dir else None
+        
+        # Re-sent recordings (UI refreshes, several displays) reuse the earlier analysis
+        self.analysis_cache = AnalysisCache(
+            max_entries=int(os.getenv('ANALYSIS_CACHE_SIZE', '32')),
+            spill_dir=os.getenv('ANALYSIS_CACHE_DIR'),
+            max_spilled=int(os.getenv('ANALYSIS_CACHE_DIR_MAX', '1024'))
+        ) if EEG_AVAILABLE else None
+        
         # Flask app for serving frontend data
         self.app = Flask(__name__)
         CORS(self.app)
@@ -92,7 +138,9 @@ class BoothBackend:
                 'eeg_connected': self.eeg_streaming,
                 'clients_connected': len(self.eeg_clients),
                 'hardware_port': self.openbci_port,
-                'processor_available': EEG_AVAILABLE
+                'processor_available': EEG_AVAILABLE,
+                'analysis_cache': self.analysis_cache.stats() if self.analysis_cache else None,
+                'signal_quality': self.signal_quality.summary()
             })
     
     def connect_openbci_hardware(self):
@@ -137,15 +185,28 @@ class BoothBackend:
                             if buffer[start + 32] == 0xC0:
                                 packet = buffer[start:start + 33]
                                 packet_count += 1
+                                self.eeg_packet_num = packet_count
 
                                 # Parse 8 channels
                                 channels = []
+                                raw_values = []
                                 for i in range(8):
                                     idx = 2 + (i * 3)
                                     val = (packet[idx] << 16) | (packet[idx+1] << 8) | packet[idx+2]
                                     if val & 0x800000:
                                         val -= 0x1000000
+                                    raw_values.append(val)
                                     channels.append(round(val * self.openbci_scale, 2))
+                                
+                                # Once per window, tell clients how good the contact is
+                                quality = self.signal_quality.update(raw_values, channels)
+                                if quality is not None:
+                                    if quality['abort_recommended']:
+                                        logger.warning(f"EEG signal unusable, session should be redone: {quality['channels']}")
+                                    try:
+                                        self.eeg_data_queue.put_nowait(json.dumps(quality))
+                                    except queue.Full:
+                                        pass
 
                                 # Create EEG data message
                                 eeg_data = {
@@ -221,6 +282,16 @@ class BoothBackend:
         if request.get('type') == 'analyze':
             logger.info("🧠 Processing EEG analysis request...")
             
+            # Don't spend a full analysis on a recording with bad electrode contact
+            if self.signal_quality_gate and self.signal_quality.samples and not self.signal_quality.is_usable():
+                await websocket.send(json.dumps({
+                    'type': 'error',
+                    'error_type': 'signal_quality',
+                    'message': 'EEG signal quality too poor for analysis. Check electrode contact and record again.',
+                    'signal_quality': self.signal_quality.summary()
+                }))
+                return
+            
             eeg_samples = request.get('data', [])
             if not eeg_samples:
                 await websocket.send(json.dumps({
@@ -235,19 +306,63 @@ class BoothBackend:
                 for ch in range(8):
                     channel_samples = [sample['channels'][ch] for sample in eeg_samples 
                                      if len(sample.get('channels', [])) > ch]
-                    channels_data.append(np.array(channel_samples))
-
-                # Analyze with scientific backend
-                love_analysis = self.eeg_processor.calculate_love_score(channels_data)
-                frequency_analysis = self.eeg_processor.get_frequency_summary(channels_data)
+                    channels_data.append(np.array(channel_samples, dtype=self.eeg_processor.dtype))
+
+                # Stimulus onsets as positions in this segment (markers may come with the request)
+                markers = request.get('markers') or list(self.stimulus_markers)
+                stimulus_samples = self.marker_sample_indices(eeg_samples, markers)
+
+                # Optional score-over-time curve for showing peak moments
+                curve_options = None
+                if request.get('curve'):
+                    curve_options = {
+                        'window_seconds': float(request.get('window_seconds', 4.0)),
+                        'step_seconds': float(request.get('step_seconds', 0.5))
+                    }
 
-                logger.info(f"✅ Analysis complete: Love Score = {love_analysis['love_score']}")
+                def analyze():
+                    # Analyze with scientific backend
+                    results = {
+                        'love_analysis': self.eeg_processor.calculate_love_score(channels_data, stimulus_samples),
+                        'frequency_summary': self.eeg_processor.get_frequency_summary(channels_data),
+                        'love_curve': None
+                    }
+                    if curve_options:
+                        results['love_curve'] = self.eeg_processor.calculate_love_score_curve(
+                            channels_data, stimulus_samples=stimulus_samples, **curve_options
+                        )
+                    return results
+
+                key = analysis_key(
+                    channels_data,
+                    self.eeg_processor,
+                    stimulus_samples=stimulus_samples,
+                    curve=curve_options
+                )
+                results, cached = await self.analysis_cache.get_or_compute(key, analyze)
+                love_analysis = results['love_analysis']
+                frequency_analysis = results['frequency_summary']
+                love_curve = results['love_curve']
+
+                logger.info(f"✅ Analysis {'cache hit' if cached else 'complete'}: Love Score = {love_analysis['love_score']}")
+                
+                # One row per (user, session); without a session id the recording itself identifies it,
+                # so a re-sent recording is stored once however many users' requests it was shared with
+                if self.feature_store is not None and request.get('user_id'):
+                    await asyncio.get_running_loop().run_in_executor(
+                        None,
+                        self.feature_store.append,
+                        request['user_id'],
+                        request.get('session_id') or key,
+                        session_features(love_analysis, frequency_analysis)
+                    )
 
                 # Send results
                 await websocket.send(json.dumps({
                     'type': 'analysis',
                     'love_analysis': love_analysis,
                     'frequency_summary': frequency_analysis,
+                    'love_curve': love_curve,
                     'method': 'scientific_backend'
                 }))
 
@@ -257,6 +372,61 @@ class BoothBackend:
                     'type': 'error',
                     'message': f'Analysis failed: {str(e)}'
                 }))
+        
+        elif request.get('type') == 'similar_profiles':
+            if self.feature_store is None:
+                await websocket.send(json.dumps({
+                    'type': 'error',
+                    'message': 'Feature store not enabled. Set EEG_FEATURE_STORE_DIR.'
+                }))
+                return
+            
+            # Either a stored user's mean profile or an explicit feature row; the scan runs off the event loop
+            query = request.get('features') or request.get('user_id')
+            matches = await asyncio.get_running_loop().run_in_executor(
+                None,
+                functools.partial(
+                    self.feature_store.nearest_users,
+                    query,
+                    k=int(request.get('k', 10)),
+                    exclude_user=request.get('user_id')
+                )
+            ) if query else []
+            
+            await websocket.send(json.dumps({
+                'type': 'similar_profiles',
+                'user_id': request.get('user_id'),
+                'matches': matches
+            }))
+
+    def record_stimulus_marker(self, action):
+        """Stamp a scanner action with the current EEG packet number and tell EEG clients"""
+        marker = {
+            'type': 'marker',
+            'packet_num': self.eeg_packet_num,
+            'action': action,
+            'timestamp': time.time()
+        }
+        self.stimulus_markers.append(marker)
+        
+        try:
+            self.eeg_data_queue.put_nowait(json.dumps(marker))
+        except queue.Full:
+            pass
+    
+    def marker_sample_indices(self, eeg_samples, markers):
+        """Positions in eeg_samples of the packets the markers were stamped with"""
+        if not markers:
+            return []
+        
+        packet_nums = np.array([sample.get('packet_num', -1) for sample in eeg_samples])
+        marker_nums = np.array([marker.get('packet_num', -1) for marker in markers])
+        
+        positions = np.searchsorted(packet_nums, marker_nums)
+        in_range = positions < len(packet_nums)
+        positions = positions[in_range]
+        matched = packet_nums[positions] == marker_nums[in_range]
+        return positions[matched].tolist()
 
     async def broadcast_eeg_data(self):
         """Broadcast EEG data to all connected clients"""
@@ -282,6 +452,9 @@ class BoothBackend:
         async def run_eeg_server():
             logger.info(f"Starting EEG WebSocket server on port {self.eeg_server_port}")
             
+            # Analysis runs on this loop, so it gets its own monitor
+            start_loop_monitor_from_env('booth-eeg')
+            
             # Start EEG data broadcaster
             broadcast_task = asyncio.create_task(self.broadcast_eeg_data())
             
@@ -306,6 +479,8 @@ class BoothBackend:
         """Start EEG hardware connection when user connects"""
         if not self.eeg_streaming:
             if self.connect_openbci_hardware():
+                self.signal_quality.reset()
+                
                 # Start serial reader thread
                 serial_thread = threading.Thread(target=self.openbci_serial_reader, daemon=True)
                 serial_thread.start()
@@ -317,6 +492,8 @@ class BoothBackend:
         """Stop EEG hardware when user disconnects"""
         if self.eeg_streaming:
             self.eeg_streaming = False
+            self.eeg_packet_num = 0
+            self.stimulus_markers.clear()
             if self.eeg_serial:
                 try:
                     self.eeg_serial.close()
@@ -325,12 +502,18 @@ class BoothBackend:
                 self.eeg_serial = None
             logger.info("EEG hardware stopped")
     
+    def reconnect_delay(self, attempt):
+        """Full-jitter exponential backoff so a venue of booths doesn't reconnect in lockstep"""
+        ceiling = min(self.reconnect_max_delay, self.reconnect_base_delay * (2 ** attempt))
+        return random.uniform(self.reconnect_base_delay, max(self.reconnect_base_delay, ceiling))
+    
     async def connect_to_relayer(self):
-        """Connect to the relayer server and register booth"""
-        max_retries = 5
-        retry_count = 0
+        """Connect to the relayer server and register booth, reconnecting until stopped"""
+        attempt = 0
         
-        while retry_count < max_retries:
+        while True:
+            self.registered = False
+            
             try:
                 logger.info(f"Attempting to connect to relayer at {self.relayer_url}")
                 
@@ -344,10 +527,14 @@ class BoothBackend:
                 else:
                     self.websocket = await websockets.connect(self.relayer_url)
                 
-                # Register booth
+                # Register booth, presenting the previous session so the relayer can resume it
                 registration_message = {
                     "type": "register_booth",
                     "booth_id": self.booth_id,
+                    "batching": True,
+                    "resumable": True,
+                    "session_token": self.session_token,
+                    "last_received_seq": self.last_received_seq,
                     "timestamp": datetime.now().isoformat()
                 }
                 
@@ -361,16 +548,19 @@ class BoothBackend:
                 await self.listen_for_messages()
                 
             except Exception as e:
-                retry_count += 1
-                logger.error(f"Connection failed (attempt {retry_count}): {e}")
+                logger.error(f"Connection failed (attempt {attempt + 1}): {e}")
                 self.is_connected = False
                 self.connection_status = "connection_failed"
-                
-                if retry_count < max_retries:
-                    await asyncio.sleep(5)  # Wait before retry
-                else:
-                    logger.error("Max retries reached. Could not connect to relayer.")
-                    break
+            
+            # A connection that got as far as registering resets the backoff
+            if self.registered:
+                attempt = 0
+            self.registered = False
+            
+            delay = self.reconnect_delay(attempt)
+            attempt += 1
+            logger.info(f"Reconnecting to relayer in {delay:.1f}s")
+            await asyncio.sleep(delay)
     
     async def listen_for_messages(self):
         """Listen for messages from the relayer server"""
@@ -378,16 +568,21 @@ class BoothBackend:
             async for message in self.websocket:
                 try:
                     data = json.loads(message)
-                    await self.handle_message(data)
+                    if data.get('type') == 'batch':
+                        # Relayer coalesced several messages into one frame
+                        for batched in data.get('messages', []):
+                            await self.handle_message(batched)
+                    else:
+                        await self.handle_message(data)
                 except json.JSONDecodeError:
                     logger.error("Received invalid JSON message")
                 except Exception as e:
                     logger.error(f"Error handling message: {e}")
         
         except websockets.exceptions.ConnectionClosed:
+            # Scanner state is kept until we learn whether the session resumes
             logger.info("Connection to relayer closed")
             self.is_connected = False
-            self.scanner_connected = False
             self.connection_status = "disconnected"
         
         except Exception as e:
@@ -401,9 +596,16 @@ class BoothBackend:
         
         logger.info(f"Booth received message: {data}")
         
+        # Sequenced messages may be replayed after a reconnect; skip ones already handled
+        seq = data.get('seq')
+        if seq is not None:
+            if seq <= self.last_received_seq:
+                return
+            self.last_received_seq = seq
+            self.trim_replay_buffer(data.get('ack', 0))
+        
         if message_type == 'registration_success':
-            logger.info(f"Booth {self.booth_id} registered successfully")
-            self.connection_status = "registered"
+            await self.handle_registration_success(data)
         
         elif message_type == 'scanner_connected':
             logger.info("Scanner connected to booth")
@@ -441,6 +643,11 @@ class BoothBackend:
             scanner_data = data.get('data', {})
             logger.info(f"Message from scanner: {scanner_data}")
             
+            # Anything the scanner does mid-recording is a stimulus for P300 epochs
+            action = scanner_data.get('action')
+            if action and action not in NON_STIMULUS_ACTIONS and self.eeg_streaming:
+                self.record_stimulus_marker(action)
+            
             # Handle different scanner messages
             if scanner_data.get('action') == 'connection_established':
                 logger.info("Scanner established connection")
@@ -474,14 +681,70 @@ class BoothBackend:
             logger.error(f"Error from relayer: {data.get('message')}")
             self.connection_status = "error"
     
+    async def handle_registration_success(self, data):
+        """Adopt the relayer session and replay anything it missed while we were away"""
+        self.registered = True
+        self.connection_status = "registered"
+        
+        if data.get('resumed'):
+            self.trim_replay_buffer(data.get('ack', data.get('last_received_seq', 0)))
+            logger.info(f"Booth {self.booth_id} resumed session, replaying {len(self.replay_buffer)} messages")
+            if self.scanner_connected:
+                self.connection_status = "user_connected"
+            for _, encoded in list(self.replay_buffer):
+                await self.websocket.send(encoded)
+            await self.flush_pending_messages()
+            return
+        
+        logger.info(f"Booth {self.booth_id} registered successfully")
+        
+        # A fresh session means the relayer forgot us: sequence numbers and pairing start over
+        self.session_token = data.get('session_token')
+        self.last_received_seq = 0
+        self.next_seq = 1
+        self.replay_buffer.clear()
+        self.pending_messages.clear()
+        if self.scanner_connected:
+            logger.info("Previous scanner session was lost")
+            self.scanner_connected = False
+            self.stop_eeg_hardware()
+    
+    def trim_replay_buffer(self, ack):
+        """Forget messages the relayer has confirmed receiving"""
+        while self.replay_buffer and self.replay_buffer[0][0] <= ack:
+            self.replay_buffer.popleft()
+    
+    async def flush_pending_messages(self):
+        """Sequence and send relay messages that waited for registration to complete"""
+        while self.pending_messages:
+            await self.send_to_relayer(self.pending_messages.popleft())
+    
     async def send_to_relayer(self, message):
-        """Send message to relayer server"""
-        if self.websocket and self.is_connected:
+        """Send message to relayer server, buffering it for replay if the link drops"""
+        if message.get('type') == 'relay_message' and not self.registered:
+            # Until registration_success we don't know whether the session resumed or started
+            # over, so the message can't be given a seq yet
+            self.pending_messages.append(message)
+            logger.info("Not registered with relayer yet; message held until registration completes")
+            return
+        
+        if message.get('type') == 'relay_message':
+            message['seq'] = self.next_seq
+            message['ack'] = self.last_received_seq
+            self.next_seq += 1
+        
+        encoded = json.dumps(message)
+        if 'seq' in message:
+            self.replay_buffer.append((message['seq'], encoded))
+        
+        if self.websocket and self.registered:
             try:
-                await self.websocket.send(json.dumps(message))
+                await self.websocket.send(encoded)
                 logger.info(f"Sent to relayer: {message}")
             except Exception as e:
                 logger.error(f"Failed to send message to relayer: {e}")
+        elif 'seq' in message:
+            logger.info("Relayer link down; message buffered for replay after reconnect")
         else:
             logger.warning("Cannot send message: not connected to relayer")
     
@@ -510,13 +773,12 @@ class BoothBackend:
 
 async def main():
     # You can specify booth_id as command line argument or let it auto-generate
-    import sys
-    
     booth_id = None
     if len(sys.argv) > 1:
         booth_id = sys.argv[1]
     
     booth = BoothBackend(booth_id=booth_id)
+    start_loop_monitor_from_env('booth-relayer-link')
     
     try:
         await booth.run()
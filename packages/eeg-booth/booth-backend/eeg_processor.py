@@ -7,10 +7,19 @@ from scipy import signal
 from scipy.stats import zscore
 
 class EEGProcessor:
-    def __init__(self, sampling_rate=250):
+    def __init__(self, sampling_rate=250, dtype=np.float64):
         self.sampling_rate = sampling_rate
         self.nyquist = sampling_rate / 2
         
+        # float64 (default) or float32; float32 halves memory traffic at ~1e-5 relative error
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.dtype(np.float64), np.dtype(np.float32)):
+            raise ValueError(f"Unsupported EEG processing dtype: {self.dtype}")
+        
+        # Filter designs per (low, high) band and the float32 padding buffer, reused between calls
+        self.filter_cache = {}
+        self.scratch = np.empty(0, dtype=self.dtype)
+        
         # Frequency band definitions (Hz)
         self.bands = {
             'delta': (0.5, 4),
@@ -20,12 +29,55 @@ class EEGProcessor:
             'gamma': (30, 45)
         }
         
+        # Fewer stimulus-locked epochs than this is too noisy; fall back to continuous P300
+        self.min_p300_epochs = 5
+        
+    def as_signal(self, data):
+        """View data in the processor's dtype, copying only if it is not already in it"""
+        return np.asarray(data, dtype=self.dtype)
+    
+    def get_filter(self, low_freq, high_freq):
+        """Cached 4th-order Butterworth bandpass design for this processor's dtype"""
+        key = (low_freq, high_freq)
+        design = self.filter_cache.get(key)
+        if design is None:
+            band = [low_freq / self.nyquist, high_freq / self.nyquist]
+            if self.dtype == np.float64:
+                design = signal.butter(4, band, btype='band')
+            else:
+                # Transfer-function form loses too much precision in float32; use second-order sections
+                sos = signal.butter(4, band, btype='band', output='sos')
+                design = (sos.astype(np.float32), signal.sosfilt_zi(sos).astype(np.float32))
+            self.filter_cache[key] = design
+        return design
+    
     def bandpass_filter(self, data, low_freq, high_freq):
         """Apply bandpass filter to data"""
-        low = low_freq / self.nyquist
-        high = high_freq / self.nyquist
-        b, a = signal.butter(4, [low, high], btype='band')
-        return signal.filtfilt(b, a, data)
+        if self.dtype == np.float64:
+            b, a = self.get_filter(low_freq, high_freq)
+            return signal.filtfilt(b, a, data)
+        
+        sos, zi = self.get_filter(low_freq, high_freq)
+        return self.sosfiltfilt_float32(sos, zi, self.as_signal(data))
+    
+    def sosfiltfilt_float32(self, sos, zi, data):
+        """Zero-phase filtering in float32, equivalent to scipy's sosfiltfilt with odd padding"""
+        n = len(data)
+        edge = 3 * (2 * len(sos) + 1 - min((sos[:, 2] == 0).sum(), (sos[:, 5] == 0).sum()))
+        if n <= edge:
+            raise ValueError(f"Need more than {edge} samples to filter")
+        
+        # Odd extension at both ends, assembled in the reused scratch buffer
+        if len(self.scratch) < n + 2 * edge:
+            self.scratch = np.empty(n + 2 * edge, dtype=np.float32)
+        padded = self.scratch[:n + 2 * edge]
+        padded[edge:edge + n] = data
+        np.subtract(2 * data[0], data[edge:0:-1], out=padded[:edge])
+        np.subtract(2 * data[-1], data[-2:-edge - 2:-1], out=padded[edge + n:])
+        
+        forward, _ = signal.sosfilt(sos, padded, zi=zi * padded[0])
+        backward, _ = signal.sosfilt(sos, forward[::-1], zi=zi * forward[-1])
+        return backward[::-1][edge:edge + n]
     
     def calculate_power_spectral_density(self, data):
         """Calculate power spectral density using Welch's method"""
@@ -36,6 +88,9 @@ class EEGProcessor:
         """Extract power in specific frequency band"""
         low_freq, high_freq = self.bands[band_name]
         filtered_data = self.bandpass_filter(data, low_freq, high_freq)
+        if self.dtype == np.float32:
+            # Mean square without a squared temporary
+            return float(np.dot(filtered_data, filtered_data)) / len(filtered_data)
         return np.mean(filtered_data ** 2)
     
     def calculate_frontal_alpha_asymmetry(self, left_frontal, right_frontal):
@@ -92,12 +147,56 @@ class EEGProcessor:
         else:
             return 0
     
-    def calculate_love_score(self, channels_data):
+    def detect_p300_epochs(self, channels_data, stimulus_samples, baseline_ms=200, epoch_ms=800, window_ms=(250, 400)):
+        """
+        Stimulus-locked P300 from averaged epochs
+        Based on Polich (2007), Luck (2014)
+        
+        Args:
+            channels_data: Equal-length channel arrays (or a channels x samples array)
+            stimulus_samples: Sample index of each stimulus onset
+        
+        Returns:
+            dict with per-channel mean amplitude and peak latency in the P300 window,
+            or None if no stimulus has a complete epoch
+        """
+        data = self.as_signal(channels_data)
+        pre = int(round(baseline_ms * self.sampling_rate / 1000))
+        post = int(round(epoch_ms * self.sampling_rate / 1000))
+        epoch_length = pre + post
+        
+        starts = np.asarray(stimulus_samples, dtype=np.int64) - pre
+        starts = starts[(starts >= 0) & (starts + epoch_length <= data.shape[1])]
+        if len(starts) == 0:
+            return None
+        
+        # Sum epochs through basic slices (views), so no (channels, epochs, epoch_length) copy is made
+        erp = np.zeros((data.shape[0], epoch_length))
+        for start in starts:
+            erp += data[:, start:start + epoch_length]
+        erp /= len(starts)
+        
+        # Baseline correction is linear, so correcting the average equals averaging corrected epochs
+        erp -= erp[:, :pre].mean(axis=1, keepdims=True)
+        
+        # P300 window, measured from stimulus onset
+        low = pre + int(round(window_ms[0] * self.sampling_rate / 1000))
+        high = pre + int(round(window_ms[1] * self.sampling_rate / 1000)) + 1
+        p300_window = erp[:, low:high]
+        
+        return {
+            'amplitudes': p300_window.mean(axis=1),
+            'latency_ms': (np.argmax(p300_window, axis=1) + low - pre) * 1000 / self.sampling_rate,
+            'epochs': len(starts)
+        }
+    
+    def calculate_love_score(self, channels_data, stimulus_samples=None):
         """
         Calculate love/attraction score using multiple EEG markers
         
         Args:
             channels_data: List of 8 numpy arrays (one per channel)
+            stimulus_samples: Optional stimulus onset sample indices for epoch-based P300
             
         Returns:
             dict with love score and component analysis
@@ -105,6 +204,8 @@ class EEGProcessor:
         if len(channels_data) < 8:
             raise ValueError("Need 8 channels of EEG data")
         
+        channels_data = [self.as_signal(channel_data) for channel_data in channels_data]
+        
         # Assume standard 10-20 electrode placement:
         # Ch1: Fp1 (left frontal)
         # Ch2: Fp2 (right frontal) 
@@ -122,12 +223,21 @@ class EEGProcessor:
         arousal_normalized = np.tanh(arousal / 5)  # Normalize 
         
         # 3. P300 Attention Component (30% weight)
-        p300_amplitudes = []
-        for channel_data in channels_data[:4]:  # Use first 4 channels
-            p300_amp = self.detect_p300_component(channel_data)
-            p300_amplitudes.append(p300_amp)
+        p300_epochs = None
+        if stimulus_samples is not None and len(stimulus_samples) >= self.min_p300_epochs:
+            p300_epochs = self.detect_p300_epochs(channels_data[:4], stimulus_samples)
         
-        avg_p300 = np.mean(p300_amplitudes)
+        if p300_epochs is not None and p300_epochs['epochs'] >= self.min_p300_epochs:
+            avg_p300 = float(np.mean(p300_epochs['amplitudes']))
+            p300_method = 'stimulus_epochs'
+        else:
+            p300_amplitudes = []
+            for channel_data in channels_data[:4]:  # Use first 4 channels
+                p300_amp = self.detect_p300_component(channel_data)
+                p300_amplitudes.append(p300_amp)
+            
+            avg_p300 = np.mean(p300_amplitudes)
+            p300_method = 'continuous'
         p300_normalized = np.tanh(avg_p300 / 10)  # Normalize
         
         # Combine components with weights
@@ -150,13 +260,140 @@ class EEGProcessor:
             'raw_values': {
                 'faa': faa,
                 'avg_arousal': arousal,
-                'p300_amplitude': avg_p300
+                'p300_amplitude': avg_p300,
+                'p300_method': p300_method,
+                'p300_epochs': p300_epochs['epochs'] if p300_epochs else 0
             },
             'confidence': min(100, max(0, 
                 70 + 10 * abs(faa_normalized) + 10 * abs(arousal_normalized) + 10 * abs(p300_normalized)
             ))
         }
     
+    def windowed_band_power(self, data, band_name, starts, window_length):
+        """Band power of every window [start, start + window_length) from one filtering pass"""
+        low_freq, high_freq = self.bands[band_name]
+        filtered_data = self.bandpass_filter(data, low_freq, high_freq)
+        
+        # Prefix sums of squares (accumulated in float64 so window differences don't cancel)
+        energy = np.empty(len(filtered_data) + 1)
+        energy[0] = 0.0
+        np.cumsum(np.square(filtered_data, dtype=np.float64), out=energy[1:])
+        return (energy[starts + window_length] - energy[starts]) / window_length
+    
+    def windowed_p300(self, channels_data, starts, window_length, stimulus_samples=None,
+                      baseline_ms=200, epoch_ms=800, window_ms=(250, 400)):
+        """
+        P300 amplitude per window, averaged over channels
+        
+        Windows containing stimulus onsets average those epochs' baseline-corrected
+        250-400 ms amplitudes; other windows use the continuous peak detector, run
+        once over the whole recording (peak threshold from the full-recording std).
+        """
+        ends = starts + window_length
+        
+        # Continuous estimate: mean peak height inside each window, per channel
+        continuous = np.zeros(len(starts))
+        for channel_data in channels_data:
+            smoothed = signal.savgol_filter(channel_data, 11, 3)
+            peaks, properties = signal.find_peaks(smoothed, height=np.std(smoothed))
+            height_sums = np.concatenate(([0.0], np.cumsum(properties['peak_heights'])))
+            first, last = np.searchsorted(peaks, starts), np.searchsorted(peaks, ends)
+            counts = last - first
+            continuous += np.where(counts > 0, (height_sums[last] - height_sums[first]) / np.maximum(counts, 1), 0.0)
+        continuous /= len(channels_data)
+        
+        if stimulus_samples is None or len(stimulus_samples) == 0:
+            return continuous, np.zeros(len(starts), dtype=np.int64)
+        
+        data = self.as_signal(channels_data)
+        pre = int(round(baseline_ms * self.sampling_rate / 1000))
+        post = int(round(epoch_ms * self.sampling_rate / 1000))
+        low = pre + int(round(window_ms[0] * self.sampling_rate / 1000))
+        high = pre + int(round(window_ms[1] * self.sampling_rate / 1000)) + 1
+        
+        onsets = np.sort(np.asarray(stimulus_samples, dtype=np.int64))
+        onsets = onsets[(onsets - pre >= 0) & (onsets + post <= data.shape[1])]
+        if len(onsets) == 0:
+            return continuous, np.zeros(len(starts), dtype=np.int64)
+        
+        # Per-epoch amplitude (P300 window mean minus baseline mean), averaged over channels.
+        # Both means are linear, so they come from prefix sums of the channel average; no epoch is copied
+        signal_sums = np.concatenate(([0.0], np.cumsum(data.mean(axis=0, dtype=np.float64))))
+        epoch_starts = onsets - pre
+        window_means = (signal_sums[epoch_starts + high] - signal_sums[epoch_starts + low]) / (high - low)
+        baseline_means = (signal_sums[onsets] - signal_sums[epoch_starts]) / pre
+        amplitudes = window_means - baseline_means
+        
+        amplitude_sums = np.concatenate(([0.0], np.cumsum(amplitudes, dtype=np.float64)))
+        first, last = np.searchsorted(onsets, starts), np.searchsorted(onsets, ends)
+        epoch_counts = last - first
+        stimulus_locked = (amplitude_sums[last] - amplitude_sums[first]) / np.maximum(epoch_counts, 1)
+        return np.where(epoch_counts > 0, stimulus_locked, continuous), epoch_counts
+    
+    def calculate_love_score_curve(self, channels_data, window_seconds=4.0, step_seconds=0.5, stimulus_samples=None):
+        """
+        Love score over time from sliding windows
+        
+        Every band is filtered once over the whole recording; window band powers
+        come from prefix sums, and FAA, arousal and P300 are combined for all
+        windows at once with the same weights as calculate_love_score.
+        
+        Returns:
+            dict with window centre times (s), love score and component curves, and the peak moment
+        """
+        if len(channels_data) < 8:
+            raise ValueError("Need 8 channels of EEG data")
+        
+        channels_data = [self.as_signal(channel_data) for channel_data in channels_data]
+        window_length = int(round(window_seconds * self.sampling_rate))
+        step = max(1, int(round(step_seconds * self.sampling_rate)))
+        if len(channels_data[0]) < window_length:
+            raise ValueError(f"Need at least {window_seconds} s of EEG data")
+        
+        starts = np.arange(0, len(channels_data[0]) - window_length + 1, step)
+        
+        # 1. Frontal Alpha Asymmetry per window
+        left_alpha = self.windowed_band_power(channels_data[0], 'alpha', starts, window_length)
+        right_alpha = self.windowed_band_power(channels_data[1], 'alpha', starts, window_length)
+        faa_normalized = np.tanh(np.log(right_alpha + 1e-10) - np.log(left_alpha + 1e-10))
+        
+        # 2. Arousal per window, averaged over channels
+        arousal = np.mean([
+            np.log(
+                self.windowed_band_power(channel_data, 'beta', starts, window_length) +
+                self.windowed_band_power(channel_data, 'gamma', starts, window_length) + 1e-10
+            )
+            for channel_data in channels_data
+        ], axis=0)
+        arousal_normalized = np.tanh(arousal / 5)
+        
+        # 3. P300 per window
+        p300, p300_epochs = self.windowed_p300(channels_data[:4], starts, window_length, stimulus_samples)
+        p300_normalized = np.tanh(p300 / 10)
+        
+        love_score = 0.4 * faa_normalized + 0.3 * arousal_normalized + 0.3 * p300_normalized
+        love_score_percent = ((love_score + 1) / 2) * 100
+        
+        times = (starts + window_length / 2) / self.sampling_rate
+        peak = int(np.argmax(love_score_percent))
+        
+        return {
+            'times': np.round(times, 3).tolist(),
+            'love_score': np.round(love_score_percent, 1).tolist(),
+            'components': {
+                'frontal_alpha_asymmetry': np.round(faa_normalized * 100, 1).tolist(),
+                'arousal_level': np.round(arousal_normalized * 100, 1).tolist(),
+                'attention_p300': np.round(p300_normalized * 100, 1).tolist()
+            },
+            'p300_epochs': p300_epochs.tolist(),
+            'peak': {
+                'time': round(float(times[peak]), 3),
+                'love_score': round(float(love_score_percent[peak]), 1)
+            },
+            'window_seconds': window_seconds,
+            'step_seconds': step_seconds
+        }
+    
     def get_frequency_summary(self, channels_data):
         """Get frequency band power summary for all channels"""
         summary = {}
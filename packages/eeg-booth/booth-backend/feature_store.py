@@ -0,0 +1,197 @@
+"""
+Append-only EEG feature store with nearest-neighbour lookup
+One fixed-width float32 row per analysed session, memory-mapped for queries
+"""
+import json
+import os
+import threading
+import time
+import numpy as np
+
+CHANNEL_COUNT = 8
+BANDS = ('delta', 'theta', 'alpha', 'beta', 'gamma')
+
+# Row layout: log band power per channel and band, then the love-score markers
+FEATURE_NAMES = tuple(
+    f'log_power_ch{channel}_{band}' for channel in range(1, CHANNEL_COUNT + 1) for band in BANDS
+) + ('faa', 'arousal', 'p300_amplitude')
+FEATURE_COUNT = len(FEATURE_NAMES)
+
+def session_features(love_analysis, frequency_summary):
+    """Feature row from calculate_love_score and get_frequency_summary results"""
+    row = np.empty(FEATURE_COUNT, dtype=np.float32)
+    
+    # Band powers span orders of magnitude; log scale keeps one loud band from dominating distances
+    powers = [
+        frequency_summary[f'channel_{channel}'][band]
+        for channel in range(1, CHANNEL_COUNT + 1) for band in BANDS
+    ]
+    row[:len(powers)] = np.log(np.asarray(powers, dtype=np.float64) + 1e-10)
+    
+    raw_values = love_analysis['raw_values']
+    row[len(powers):] = (raw_values['faa'], raw_values['avg_arousal'], raw_values['p300_amplitude'])
+    return row
+
+class FeatureStore:
+    """
+    Session feature vectors on disk, indexed by user and session
+    
+    features.f32 holds the rows back to back and only ever grows; index.jsonl has
+    one {user_id, session_id, timestamp} line per row. Queries read the rows
+    through a memory map in blocks, so the store can be larger than memory.
+    
+    Methods do blocking file I/O and are safe to call from worker threads.
+    """
+    
+    def __init__(self, directory, block_rows=65536):
+        self.directory = directory
+        self.block_rows = block_rows
+        self.features_path = os.path.join(directory, 'features.f32')
+        self.index_path = os.path.join(directory, 'index.jsonl')
+        self.lock = threading.Lock()
+        
+        self.user_ids = []          # user id per user code
+        self.user_codes = {}        # user id -> user code
+        self.row_users = []         # user code per row
+        self.row_sessions = []      # session id per row
+        self.session_rows = {}      # (user id, session id) -> row
+        self.mapped = None
+        self.mapped_rows = 0
+        
+        os.makedirs(directory, exist_ok=True)
+        self.load_index()
+    
+    def __len__(self):
+        return len(self.row_users)
+    
+    def load_index(self):
+        rows = 0
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'r') as f:
+                for line in f:
+                    entry = json.loads(line)
+                    self.session_rows.setdefault((entry['user_id'], entry['session_id']), rows)
+                    self.row_users.append(self.user_code(entry['user_id']))
+                    self.row_sessions.append(entry['session_id'])
+                    rows += 1
+        
+        # A crash between the two appends can leave a partial row; ignore anything not indexed
+        stored_rows = os.path.getsize(self.features_path) // (4 * FEATURE_COUNT) if os.path.exists(self.features_path) else 0
+        if stored_rows < rows:
+            raise ValueError(f"Feature store {self.directory} is missing rows: {stored_rows} stored, {rows} indexed")
+    
+    def user_code(self, user_id):
+        code = self.user_codes.get(user_id)
+        if code is None:
+            code = len(self.user_ids)
+            self.user_codes[user_id] = code
+            self.user_ids.append(user_id)
+        return code
+    
+    def append(self, user_id, session_id, features):
+        """Persist one session's feature row; a session already stored keeps its original row"""
+        row = np.asarray(features, dtype=np.float32).reshape(FEATURE_COUNT)
+        
+        with self.lock:
+            existing = self.session_rows.get((user_id, session_id))
+            if existing is not None:
+                return existing
+            
+            # Truncate any partial row left by an interrupted write before appending
+            offset = len(self.row_users) * 4 * FEATURE_COUNT
+            with open(self.features_path, 'ab') as f:
+                f.truncate(offset)
+                f.write(row.tobytes())
+            with open(self.index_path, 'a') as f:
+                f.write(json.dumps({'user_id': user_id, 'session_id': session_id, 'timestamp': time.time()}) + '\n')
+            
+            self.session_rows[(user_id, session_id)] = len(self.row_users)
+            self.row_users.append(self.user_code(user_id))
+            self.row_sessions.append(session_id)
+            return len(self.row_users) - 1
+    
+    def rows(self):
+        """Memory-mapped (rows, FEATURE_COUNT) view of every stored row"""
+        count = len(self.row_users)
+        if self.mapped is None or self.mapped_rows != count:
+            self.mapped = np.memmap(self.features_path, dtype=np.float32, mode='r',
+                                    shape=(count, FEATURE_COUNT)) if count else np.empty((0, FEATURE_COUNT), np.float32)
+            self.mapped_rows = count
+        return self.mapped
+    
+    def user_rows(self, user_id):
+        code = self.user_codes.get(user_id)
+        if code is None:
+            return np.empty((0, FEATURE_COUNT), dtype=np.float32)
+        with self.lock:
+            indices = np.flatnonzero(np.asarray(self.row_users) == code)
+            rows = self.rows()
+        return np.asarray(rows[indices])
+    
+    def feature_scale(self, rows):
+        """Per-feature standard deviation, accumulated block by block"""
+        total = np.zeros(FEATURE_COUNT)
+        total_sq = np.zeros(FEATURE_COUNT)
+        for start in range(0, len(rows), self.block_rows):
+            block = np.asarray(rows[start:start + self.block_rows], dtype=np.float64)
+            total += block.sum(axis=0)
+            total_sq += np.square(block).sum(axis=0)
+        mean = total / len(rows)
+        std = np.sqrt(np.maximum(total_sq / len(rows) - mean ** 2, 0.0))
+        return np.where(std > 1e-6, std, 1.0)
+    
+    def nearest_users(self, query, k=10, exclude_user=None):
+        """
+        Users whose closest session is nearest to query (standardized Euclidean distance)
+        
+        Args:
+            query: Feature row, or a user id to use that user's mean profile
+        
+        Returns:
+            List of {user_id, session_id, distance}, closest first
+        """
+        if isinstance(query, str):
+            exclude_user = query if exclude_user is None else exclude_user
+            own_rows = self.user_rows(query)
+            if len(own_rows) == 0:
+                return []
+            query = own_rows.mean(axis=0)
+        
+        with self.lock:
+            rows = self.rows()
+            row_users = np.asarray(self.row_users, dtype=np.int64)
+            user_count = len(self.user_ids)
+        if len(rows) == 0:
+            return []
+        
+        weights = (1.0 / self.feature_scale(rows)).astype(np.float32)
+        query = np.asarray(query, dtype=np.float32) * weights
+        
+        # Squared distances for all rows, computed one block at a time
+        distances = np.empty(len(rows), dtype=np.float32)
+        for start in range(0, len(rows), self.block_rows):
+            block = rows[start:start + self.block_rows] * weights
+            block -= query
+            distances[start:start + len(block)] = np.einsum('ij,ij->i', block, block)
+        
+        # Each user's best session
+        best = np.full(user_count, np.inf, dtype=np.float32)
+        np.minimum.at(best, row_users, distances)
+        if exclude_user in self.user_codes:
+            best[self.user_codes[exclude_user]] = np.inf
+        
+        candidates = np.flatnonzero(np.isfinite(best))
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(best[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(best[candidates])]
+        
+        results = []
+        for code in candidates:
+            user_row_indices = np.flatnonzero(row_users == code)
+            best_row = user_row_indices[np.argmin(distances[user_row_indices])]
+            results.append({
+                'user_id': self.user_ids[code],
+                'session_id': self.row_sessions[best_row],
+                'distance': round(float(np.sqrt(best[code])), 4)
+            })
+        return results
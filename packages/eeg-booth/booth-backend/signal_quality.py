@@ -0,0 +1,173 @@
+"""
+Streaming EEG signal-quality monitor
+Fed one packet at a time by the serial decoder, O(1) work per sample
+"""
+import math
+
+# OpenBCI Cyton ADC values at the 24-bit limits mean the channel is railed
+RAIL_HIGH = 0x7FFFFF
+RAIL_LOW = -0x800000
+
+class ChannelQuality:
+    """Per-channel accumulators for the current window and the session"""
+    
+    __slots__ = ('count', 'mean', 'm2', 'railed', 'flat_run', 'longest_flat_run', 'previous',
+                 'goertzel_s1', 'goertzel_s2', 'good_windows', 'windows', 'bad_streak')
+    
+    def __init__(self):
+        self.good_windows = 0
+        self.windows = 0
+        self.bad_streak = 0
+        self.reset_window()
+    
+    def reset_window(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.railed = 0
+        self.flat_run = 0
+        self.longest_flat_run = 0
+        self.previous = None
+        self.goertzel_s1 = 0.0
+        self.goertzel_s2 = 0.0
+
+class SignalQualityMonitor:
+    """
+    Running per-channel variance, railing, line noise and flatline detection
+    
+    Statistics cover fixed windows (1 s by default). At the end of each window
+    update() returns a status dict for clients; between windows it returns None.
+    Line noise is measured with a Goertzel filter at the mains frequency, so a
+    whole-cycle window needs no FFT.
+    """
+    
+    def __init__(self, sampling_rate=250, channel_count=8, window_seconds=1.0, line_frequency=60,
+                 max_std_uv=100.0, max_line_noise_ratio=0.5, max_railed_fraction=0.1,
+                 flatline_seconds=0.5, flat_epsilon_uv=0.01, required_channels=(0, 1, 2, 3),
+                 min_good_fraction=0.6, abort_after_seconds=5.0):
+        self.sampling_rate = sampling_rate
+        self.channel_count = channel_count
+        self.window_size = max(1, int(round(window_seconds * sampling_rate)))
+        self.goertzel_coeff = 2 * math.cos(2 * math.pi * line_frequency / sampling_rate)
+        
+        self.max_std_uv = max_std_uv
+        self.max_line_noise_ratio = max_line_noise_ratio
+        self.max_railed_fraction = max_railed_fraction
+        self.flatline_samples = int(flatline_seconds * sampling_rate)
+        self.flat_epsilon_uv = flat_epsilon_uv
+        
+        # Channels the love score depends on (FAA uses 1-2, P300 uses 1-4)
+        self.required_channels = required_channels
+        self.min_good_fraction = min_good_fraction
+        self.abort_after_windows = max(1, int(math.ceil(abort_after_seconds / window_seconds)))
+        
+        self.reset()
+    
+    def reset(self):
+        """Start a new recording session"""
+        self.channels = [ChannelQuality() for _ in range(self.channel_count)]
+        self.samples = 0
+        self.last_status = None
+    
+    def update(self, raw_values, microvolts):
+        """Account for one packet; returns a status dict when a window completes"""
+        coeff = self.goertzel_coeff
+        epsilon = self.flat_epsilon_uv
+        
+        for channel, raw, value in zip(self.channels, raw_values, microvolts):
+            # Welford running variance
+            channel.count += 1
+            delta = value - channel.mean
+            channel.mean += delta / channel.count
+            channel.m2 += delta * (value - channel.mean)
+            
+            if raw >= RAIL_HIGH or raw <= RAIL_LOW:
+                channel.railed += 1
+            
+            if channel.previous is not None and abs(value - channel.previous) < epsilon:
+                channel.flat_run += 1
+                if channel.flat_run > channel.longest_flat_run:
+                    channel.longest_flat_run = channel.flat_run
+            else:
+                channel.flat_run = 0
+            channel.previous = value
+            
+            s0 = value + coeff * channel.goertzel_s1 - channel.goertzel_s2
+            channel.goertzel_s2 = channel.goertzel_s1
+            channel.goertzel_s1 = s0
+        
+        self.samples += 1
+        if self.samples % self.window_size:
+            return None
+        
+        self.last_status = self.close_window()
+        return self.last_status
+    
+    def close_window(self):
+        channel_statuses = []
+        for channel in self.channels:
+            n = channel.count
+            variance = channel.m2 / n
+            std = math.sqrt(variance)
+            
+            # Goertzel power -> variance of the mains component (2P / N^2)
+            s1, s2 = channel.goertzel_s1, channel.goertzel_s2
+            line_power = s1 * s1 + s2 * s2 - self.goertzel_coeff * s1 * s2
+            line_ratio = min(1.0, (2 * line_power / (n * n)) / variance) if variance > 0 else 0.0
+            railed_fraction = channel.railed / n
+            
+            if railed_fraction > self.max_railed_fraction:
+                verdict = 'railed'
+            elif channel.longest_flat_run >= self.flatline_samples:
+                verdict = 'flat'
+            elif std > self.max_std_uv or line_ratio > self.max_line_noise_ratio:
+                verdict = 'noisy'
+            else:
+                verdict = 'good'
+            
+            channel.windows += 1
+            if verdict == 'good':
+                channel.good_windows += 1
+                channel.bad_streak = 0
+            else:
+                channel.bad_streak += 1
+            
+            channel_statuses.append({
+                'quality': verdict,
+                'std_uv': round(std, 2),
+                'line_noise_ratio': round(line_ratio, 3),
+                'railed_fraction': round(railed_fraction, 3)
+            })
+            channel.reset_window()
+        
+        return {
+            'type': 'signal_quality',
+            'seconds': round(self.samples / self.sampling_rate, 1),
+            'channels': channel_statuses,
+            'usable': self.is_usable(),
+            'abort_recommended': self.abort_recommended()
+        }
+    
+    def is_usable(self):
+        """True if every required channel has been good for enough of the session so far"""
+        for index in self.required_channels:
+            channel = self.channels[index]
+            if channel.windows and channel.good_windows / channel.windows < self.min_good_fraction:
+                return False
+        return True
+    
+    def abort_recommended(self):
+        """A required channel has been bad long enough that the recording should be redone now"""
+        return any(self.channels[index].bad_streak >= self.abort_after_windows for index in self.required_channels)
+    
+    def summary(self):
+        return {
+            'seconds': round(self.samples / self.sampling_rate, 1),
+            'usable': self.is_usable(),
+            'abort_recommended': self.abort_recommended(),
+            'good_fraction': [
+                round(channel.good_windows / channel.windows, 3) if channel.windows else None
+                for channel in self.channels
+            ],
+            'last_window': self.last_status['channels'] if self.last_status else None
+        }
@@ -3,6 +3,7 @@ import './App.css';
 
 // Configuration
 const DEFAULT_RELAYER_URL = 'wss://172.24.244.146:8765';
+const MAX_RECONNECT_DELAY_MS = 10000;
 
 // QR Scanner types (since @types/qr-scanner doesn't exist)
 declare global {
@@ -40,6 +41,10 @@ function App() {
   const websocketRef = useRef<WebSocket | null>(null);
   const videoRef = useRef<HTMLVideoElement>(null);
   const qrScannerRef = useRef<any>(null);
+  // reconnect_token from the last connection_success, per booth, so a relayer restart doesn't end the pairing
+  const reconnectTokensRef = useRef<Record<string, string>>({});
+  const reconnectTimerRef = useRef<ReturnType<typeof setTimeout> | null>(null);
+  const reconnectAttemptsRef = useRef(0);
 
   const addMessage = (type: 'sent' | 'received', message: string) => {
     setConnectionState(prev => ({
@@ -52,10 +57,29 @@ function App() {
     }));
   };
 
-  const connectToRelay = useCallback(async (boothData: QRData) => {
-    if (websocketRef.current?.readyState === WebSocket.OPEN) {
+  const cancelReconnect = () => {
+    if (reconnectTimerRef.current) {
+      clearTimeout(reconnectTimerRef.current);
+      reconnectTimerRef.current = null;
+    }
+    reconnectAttemptsRef.current = 0;
+  };
+
+  const closeSocket = () => {
+    // Detach first so a deliberate close doesn't trigger a reconnect
+    if (websocketRef.current) {
+      websocketRef.current.onclose = null;
       websocketRef.current.close();
+      websocketRef.current = null;
+    }
+  };
+
+  const connectToRelay = useCallback(async (boothData: QRData) => {
+    if (reconnectTimerRef.current) {
+      clearTimeout(reconnectTimerRef.current);
+      reconnectTimerRef.current = null;
     }
+    closeSocket();
 
     setConnectionState(prev => ({
       ...prev,
@@ -71,10 +95,12 @@ function App() {
       ws.onopen = () => {
         console.log('Connected to relayer');
         
-        // Send scanner connection request
+        // Send scanner connection request; a saved token re-attaches to the existing pairing
+        const reconnectToken = reconnectTokensRef.current[boothData.booth_id];
         const connectMessage = {
           type: 'connect_scanner',
-          booth_id: boothData.booth_id
+          booth_id: boothData.booth_id,
+          ...(reconnectToken ? { reconnect_token: reconnectToken } : {})
         };
         
         ws.send(JSON.stringify(connectMessage));
@@ -87,10 +113,20 @@ function App() {
           console.log('Received from relayer:', data);
           
           if (data.type === 'connection_success') {
+            if (data.reconnect_token) {
+              reconnectTokensRef.current[boothData.booth_id] = data.reconnect_token;
+            }
+            reconnectAttemptsRef.current = 0;
             setConnectionState(prev => ({
               ...prev,
               status: 'connected'
             }));
+            
+            if (data.resumed) {
+              // The booth never saw us leave, so there is nothing to re-announce
+              addMessage('received', 'Reconnected to booth');
+              return;
+            }
             addMessage('received', 'Successfully connected to booth!');
             
             // Send connection established message
@@ -109,6 +145,7 @@ function App() {
             addMessage('received', `Booth: ${JSON.stringify(data.data)}`);
             
           } else if (data.type === 'booth_disconnected') {
+            delete reconnectTokensRef.current[boothData.booth_id];
             setConnectionState(prev => ({
               ...prev,
               status: 'disconnected'
@@ -116,6 +153,7 @@ function App() {
             addMessage('received', 'Booth disconnected');
             
           } else if (data.type === 'error') {
+            delete reconnectTokensRef.current[boothData.booth_id];
             setConnectionState(prev => ({
               ...prev,
               status: 'error',
@@ -130,6 +168,20 @@ function App() {
 
       ws.onclose = () => {
         console.log('Disconnected from relayer');
+        
+        // Still paired: retry with backoff and present the reconnect token
+        if (reconnectTokensRef.current[boothData.booth_id]) {
+          const delay = Math.min(1000 * 2 ** reconnectAttemptsRef.current, MAX_RECONNECT_DELAY_MS);
+          reconnectAttemptsRef.current += 1;
+          reconnectTimerRef.current = setTimeout(() => connectToRelay(boothData), delay);
+          setConnectionState(prev => ({
+            ...prev,
+            status: 'connecting'
+          }));
+          addMessage('received', `Lost relayer, reconnecting in ${delay / 1000}s`);
+          return;
+        }
+        
         setConnectionState(prev => ({
           ...prev,
           status: 'disconnected'
@@ -235,9 +287,9 @@ function App() {
   };
 
   const disconnect = () => {
-    if (websocketRef.current) {
-      websocketRef.current.close();
-    }
+    cancelReconnect();
+    reconnectTokensRef.current = {};
+    closeSocket();
     setConnectionState({
       status: 'disconnected',
       messages: []
@@ -250,9 +302,8 @@ function App() {
       if (qrScannerRef.current) {
         qrScannerRef.current.destroy();
       }
-      if (websocketRef.current) {
-        websocketRef.current.close();
-      }
+      cancelReconnect();
+      closeSocket();
     };
   }, []);
 
@@ -0,0 +1,82 @@
+"""
+Outbound message coalescing for relayer connections
+
+Small messages queued for the same connection within a short flush window
+are packed into a single `batch` frame, so bursts cost one websocket frame
+(and one syscall) instead of one per message.
+"""
+import asyncio
+import logging
+import websockets
+
+logger = logging.getLogger(__name__)
+
+BATCH_FRAME_TYPE = 'batch'
+
+
+def pack_batch(encoded_messages):
+    """Pack already-encoded JSON messages into one batch frame without re-encoding them"""
+    return '{"type":"%s","messages":[%s]}' % (BATCH_FRAME_TYPE, ','.join(encoded_messages))
+
+
+class MessageBatcher:
+    """Nagle-style outbound coalescer for a single websocket connection"""
+
+    def __init__(self, websocket, max_delay=0.003, max_batch_size=32):
+        self.websocket = websocket
+        self.max_delay = max_delay
+        self.max_batch_size = max_batch_size
+        self.pending = []
+        self.flush_handle = None
+        self.flush_lock = asyncio.Lock()
+        self.frames_sent = 0
+        self.messages_sent = 0
+
+    async def send(self, encoded_message):
+        """Queue an encoded message, flushing when the batch is full"""
+        self.pending.append(encoded_message)
+
+        if len(self.pending) >= self.max_batch_size:
+            await self.flush()
+        elif self.flush_handle is None:
+            loop = asyncio.get_running_loop()
+            self.flush_handle = loop.call_later(self.max_delay, self._flush_soon)
+
+    def _flush_soon(self):
+        self.flush_handle = None
+        # Nobody awaits a timer flush, so surface its failures here rather than in "exception never retrieved"
+        asyncio.ensure_future(self.flush()).add_done_callback(self._flush_done)
+
+    def _flush_done(self, task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Scheduled batch flush failed: {task.exception()!r}")
+
+    async def flush(self):
+        """Send everything pending as one frame"""
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+
+        # The lock keeps frames in order when a size-triggered flush races a timer flush
+        async with self.flush_lock:
+            if not self.pending:
+                return
+
+            messages, self.pending = self.pending, []
+            frame = messages[0] if len(messages) == 1 else pack_batch(messages)
+
+            try:
+                await self.websocket.send(frame)
+                self.frames_sent += 1
+                self.messages_sent += len(messages)
+            except websockets.exceptions.ConnectionClosed:
+                logger.warning(f"Dropped batch of {len(messages)} messages for closed connection")
+            except Exception as e:
+                logger.error(f"Dropped batch of {len(messages)} messages: {e}")
+
+    def close(self):
+        """Discard pending messages and cancel any scheduled flush"""
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        self.pending = []
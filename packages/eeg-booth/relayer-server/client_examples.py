@@ -7,6 +7,14 @@ import websockets
 import json
 import sys
 
+def unpack_frame(message):
+    """Yield individual messages from a plain or batched relayer frame"""
+    data = json.loads(message)
+    if data.get('type') == 'batch':
+        yield from data.get('messages', [])
+    else:
+        yield data
+
 async def booth_client(booth_id):
     """Example booth client"""
     uri = "ws://localhost:8765"
@@ -15,7 +23,8 @@ async def booth_client(booth_id):
         # Register as booth
         registration_message = {
             "type": "register_booth",
-            "booth_id": booth_id
+            "booth_id": booth_id,
+            "batching": True
         }
         
         await websocket.send(json.dumps(registration_message))
@@ -23,51 +32,63 @@ async def booth_client(booth_id):
         
         # Listen for messages
         async for message in websocket:
-            data = json.loads(message)
-            print(f"Booth {booth_id} received: {data}")
-            
-            # If scanner connected, send a welcome message
-            if data.get('type') == 'scanner_connected':
-                welcome_message = {
-                    "type": "relay_message",
-                    "data": {
-                        "message": f"Welcome to Booth {booth_id}!",
-                        "status": "ready"
+            for data in unpack_frame(message):
+                print(f"Booth {booth_id} received: {data}")
+                
+                # If scanner connected, send a welcome message
+                if data.get('type') == 'scanner_connected':
+                    welcome_message = {
+                        "type": "relay_message",
+                        "data": {
+                            "message": f"Welcome to Booth {booth_id}!",
+                            "status": "ready"
+                        }
                     }
-                }
-                await websocket.send(json.dumps(welcome_message))
-                print(f"Booth {booth_id} sent welcome message")
+                    await websocket.send(json.dumps(welcome_message))
+                    print(f"Booth {booth_id} sent welcome message")
 
 async def scanner_client(booth_id):
-    """Example scanner client"""
+    """Example scanner client that re-attaches to its booth after a relayer restart"""
     uri = "ws://localhost:8765"
+    reconnect_token = None
     
-    async with websockets.connect(uri) as websocket:
-        # Connect to specific booth
-        connect_message = {
-            "type": "connect_scanner",
-            "booth_id": booth_id
-        }
-        
-        await websocket.send(json.dumps(connect_message))
-        print(f"Scanner connecting to booth {booth_id}")
-        
-        # Send a test message after connection
-        await asyncio.sleep(1)
-        test_message = {
-            "type": "relay_message",
-            "data": {
-                "message": "Hello from scanner!",
-                "action": "start_scan"
-            }
-        }
-        await websocket.send(json.dumps(test_message))
-        print("Scanner sent test message")
+    while True:
+        try:
+            async with websockets.connect(uri) as websocket:
+                # Connect to specific booth, presenting the token from the last connection_success
+                connect_message = {
+                    "type": "connect_scanner",
+                    "booth_id": booth_id
+                }
+                if reconnect_token:
+                    connect_message["reconnect_token"] = reconnect_token
+                
+                await websocket.send(json.dumps(connect_message))
+                print(f"Scanner connecting to booth {booth_id}")
+                
+                # Listen for messages
+                async for message in websocket:
+                    for data in unpack_frame(message):
+                        print(f"Scanner received: {data}")
+                        
+                        if data.get('type') == 'connection_success':
+                            reconnect_token = data.get('reconnect_token')
+                            
+                            # A resumed pairing is already set up on the booth's side
+                            if not data.get('resumed'):
+                                test_message = {
+                                    "type": "relay_message",
+                                    "data": {
+                                        "message": "Hello from scanner!",
+                                        "action": "start_scan"
+                                    }
+                                }
+                                await websocket.send(json.dumps(test_message))
+                                print("Scanner sent test message")
+        except (OSError, websockets.exceptions.ConnectionClosed) as e:
+            print(f"Scanner lost the relayer ({e}), reconnecting")
         
-        # Listen for messages
-        async for message in websocket:
-            data = json.loads(message)
-            print(f"Scanner received: {data}")
+        await asyncio.sleep(2)
 
 if __name__ == "__main__":
     if len(sys.argv) < 3:
@@ -0,0 +1,266 @@
+"""
+Incremental metrics and a tiny HTTP endpoint for the relayer
+
+All counters are updated in O(1) on the hot path; snapshots are only built
+when someone asks for them over HTTP.
+"""
+import asyncio
+import bisect
+import json
+import logging
+import time
+from collections import Counter
+from urllib.parse import urlsplit, parse_qs
+
+logger = logging.getLogger(__name__)
+
+# Millisecond bucket upper bounds shared by latency-style histograms
+DEFAULT_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+# Message-count bucket upper bounds for per-connection send queue depth
+QUEUE_DEPTH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096)
+
+
+class Histogram:
+    """Fixed-bucket histogram with cheap percentile estimates"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last bucket is +Inf
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q-th quantile"""
+        if self.count == 0:
+            return 0.0
+
+        rank = q * self.count
+        cumulative = 0
+        for i, bucket_count in enumerate(self.counts):
+            cumulative += bucket_count
+            if cumulative >= rank:
+                return min(self.buckets[i], self.max) if i < len(self.buckets) else self.max
+        return self.max
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'mean': round(self.total / self.count, 3) if self.count else 0.0,
+            'p50': self.percentile(0.5),
+            'p90': self.percentile(0.9),
+            'p99': self.percentile(0.99),
+            'max': round(self.max, 3),
+            'buckets': {
+                **{str(bound): count for bound, count in zip(self.buckets, self.counts)},
+                '+Inf': self.counts[-1]
+            }
+        }
+
+
+class RateCounter:
+    """Events per second over a sliding window of one-second buckets"""
+
+    def __init__(self, window_seconds=10):
+        self.window_seconds = window_seconds
+        self.buckets = [0] * window_seconds
+        self.bucket_seconds = [0] * window_seconds
+
+    def increment(self, amount=1):
+        second = int(time.monotonic())
+        index = second % self.window_seconds
+        if self.bucket_seconds[index] != second:
+            self.bucket_seconds[index] = second
+            self.buckets[index] = 0
+        self.buckets[index] += amount
+
+    def rate(self):
+        # Only completed seconds inside the window count towards the rate
+        now = int(time.monotonic())
+        total = sum(
+            count for count, second in zip(self.buckets, self.bucket_seconds)
+            if now - self.window_seconds <= second < now
+        )
+        return total / self.window_seconds
+
+
+class RelayerMetrics:
+    """Counters and histograms maintained incrementally by RelayerServer"""
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.connections_by_role = Counter()
+        self.connections_accepted = 0
+        self.connections_rejected = 0
+        self.admissions_delayed = 0
+        self.relays_total = 0
+        self.relay_rate = RateCounter()
+        self.messages_in = 0
+        self.messages_out = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.messages_out_by_lane = Counter()
+        self.send_queue_depth = Histogram(QUEUE_DEPTH_BUCKETS)
+        self.messages_queued = 0
+        self.messages_dropped_by_policy = Counter()
+        self.errors_by_type = Counter()
+        self.relay_latency_ms = Histogram()
+        self.loop_lag_ms = Histogram()
+
+    def connection_opened(self, role='unregistered'):
+        self.connections_accepted += 1
+        self.connections_by_role[role] += 1
+
+    def connection_closed(self, role):
+        self.connections_by_role[role] -= 1
+
+    def role_changed(self, old_role, new_role):
+        if old_role != new_role:
+            self.connections_by_role[old_role] -= 1
+            self.connections_by_role[new_role] += 1
+
+    def message_received(self, message):
+        self.messages_in += 1
+        self.bytes_in += encoded_length(message)
+
+    def message_sent(self, encoded_message, lane=None):
+        self.messages_out += 1
+        if lane is not None:
+            self.messages_out_by_lane[lane] += 1
+        self.bytes_out += encoded_length(encoded_message)
+
+    def message_queued(self, depth):
+        """A message joined a connection's send queue, which now holds depth messages"""
+        self.messages_queued += 1
+        self.send_queue_depth.observe(depth)
+
+    def messages_unqueued(self, count):
+        """Messages left a send queue: sent, dropped by policy or discarded at close"""
+        self.messages_queued -= count
+
+    def message_dropped(self, policy):
+        self.messages_dropped_by_policy[policy] += 1
+
+    def relay_completed(self):
+        self.relays_total += 1
+        self.relay_rate.increment()
+
+    def relay_delivered(self, started_at):
+        """A relayed message reached its recipient's socket (or batch), started_at from perf_counter"""
+        self.relay_latency_ms.observe((time.perf_counter() - started_at) * 1000)
+
+    def error(self, error_type):
+        self.errors_by_type[error_type] += 1
+
+    async def monitor_loop_lag(self, interval=0.5):
+        """Measure how late the event loop wakes us up compared to the requested sleep"""
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + interval
+            await asyncio.sleep(interval)
+            self.loop_lag_ms.observe(max(0.0, loop.time() - expected) * 1000)
+
+    def snapshot(self):
+        return {
+            'uptime_seconds': round(time.monotonic() - self.started_at, 1),
+            'connections_by_role': {role: count for role, count in self.connections_by_role.items() if count},
+            'connections_accepted': self.connections_accepted,
+            'connections_rejected': self.connections_rejected,
+            'admissions_delayed': self.admissions_delayed,
+            'relays_total': self.relays_total,
+            'relays_per_second': self.relay_rate.rate(),
+            'messages_in': self.messages_in,
+            'messages_out': self.messages_out,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'messages_out_by_lane': dict(self.messages_out_by_lane),
+            'send_queues': {
+                'messages_queued': self.messages_queued,
+                'dropped_by_policy': dict(self.messages_dropped_by_policy),
+                'depth_at_enqueue': self.send_queue_depth.snapshot()
+            },
+            'errors_by_type': dict(self.errors_by_type),
+            'relay_latency_ms': self.relay_latency_ms.snapshot(),
+            'event_loop_lag_ms': self.loop_lag_ms.snapshot()
+        }
+
+
+def encoded_length(message):
+    """Wire size of a text or binary frame payload"""
+    if isinstance(message, str):
+        return len(message) if message.isascii() else len(message.encode('utf-8'))
+    return len(message)
+
+
+class MetricsHTTPServer:
+    """Minimal read-only HTTP server exposing relayer status on the relayer's own event loop"""
+
+    def __init__(self, relayer, host='127.0.0.1', port=8766, max_page_size=500):
+        self.relayer = relayer
+        self.host = host
+        self.port = port
+        self.max_page_size = max_page_size
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle_request, self.host, self.port)
+        logger.info(f"Metrics endpoint listening on http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def handle_request(self, reader, writer):
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), timeout=5)
+            method, target = head.split(b' ', 2)[:2]
+            status, body = await self.route(method.decode('latin-1'), target.decode('latin-1'))
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            status, body = 400, {'error': 'Bad request'}
+        except Exception as e:
+            logger.error(f"Error serving metrics request: {e}")
+            status, body = 500, {'error': 'Internal server error'}
+
+        payload = json.dumps(body).encode('utf-8')
+        reason = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed'}.get(status, 'Error')
+        writer.write(
+            f"HTTP/1.1 {status} {reason}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"Connection: close\r\n\r\n".encode('latin-1') + payload
+        )
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, method, target):
+        if method != 'GET':
+            return 405, {'error': 'Only GET is supported'}
+
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+
+        if url.path == '/metrics':
+            return 200, self.relayer.metrics.snapshot()
+
+        if url.path == '/status':
+            return 200, await self.relayer.get_status()
+
+        if url.path == '/booths':
+            offset = max(0, int(query.get('offset', ['0'])[0]))
+            limit = min(self.max_page_size, max(1, int(query.get('limit', ['50'])[0])))
+            return 200, self.relayer.list_booths(offset, limit)
+
+        return 404, {'error': f'Unknown path {url.path}'}
@@ -0,0 +1,179 @@
+"""
+Per-connection outbound lanes for the relayer
+
+Every connection gets a writer task that drains three queues. Control
+messages (registration, connection changes, errors, pongs) go out first,
+always. Relay traffic is split into an interactive lane and a bulk lane by
+encoded size, and the two share the rest of the link by deficit round robin,
+so a booth pushing large payloads cannot hold up session setup or starve
+small relays.
+"""
+import asyncio
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+CONTROL_LANE = 'control'
+RELAY_LANE = 'relay'
+BULK_LANE = 'bulk'
+LANES = (CONTROL_LANE, RELAY_LANE, BULK_LANE)
+
+CONTROL_TYPES = frozenset({
+    'registration_success',
+    'connection_success',
+    'spectate_success',
+    'scanner_connected',
+    'scanner_disconnected',
+    'booth_disconnected',
+    'error',
+    'pong'
+})
+
+DEFAULT_LANE_WEIGHTS = {RELAY_LANE: 4, BULK_LANE: 1}
+
+# What a bounded writer does with a message that arrives when it is full
+DROP_OLDEST = 'drop_oldest'
+DROP_NEWEST = 'drop_newest'
+DISCONNECT = 'disconnect'
+OVERFLOW_POLICIES = (DROP_OLDEST, DROP_NEWEST, DISCONNECT)
+
+
+def classify(message_type, encoded, sequenced=False, bulk_threshold=16384):
+    """Pick the lane for one outbound message"""
+    # Sequenced booth messages must arrive in seq order, so they all share one lane
+    if sequenced:
+        return RELAY_LANE
+    if message_type in CONTROL_TYPES:
+        return CONTROL_LANE
+    if len(encoded) >= bulk_threshold:
+        return BULK_LANE
+    return RELAY_LANE
+
+
+class ConnectionWriter:
+    """Writer task and lane queues for a single websocket connection"""
+
+    def __init__(self, websocket, write, weights=None, quantum=16384,
+                 max_queued=None, overflow=DROP_OLDEST, metrics=None):
+        self.websocket = websocket
+        self.write = write  # async (websocket, encoded, lane, started_at) doing the actual send
+        self.weights = dict(weights or DEFAULT_LANE_WEIGHTS)
+        self.quantum = quantum
+
+        # Optional bound on relay + bulk messages waiting; control is never dropped
+        self.max_queued = max_queued
+        self.overflow = overflow
+        self.dropped = 0
+        self.closed = False
+        self.metrics = metrics  # RelayerMetrics, told about every queue change
+
+        self.lanes = {lane: deque() for lane in LANES}  # (encoded, started_at) per lane
+        self.weighted_lanes = [lane for lane in LANES if lane != CONTROL_LANE]
+        self.deficits = {lane: 0 for lane in self.weighted_lanes}
+        self.turn = 0
+
+        self.ready = asyncio.Event()
+        self.task = asyncio.ensure_future(self.run())
+
+    def enqueue(self, lane, encoded, started_at=None):
+        """
+        Queue a message; returns False if the overflow policy rejected it
+        
+        started_at (a perf_counter reading) travels with the message to the writer,
+        so relay latency covers the time spent queued and being written.
+        """
+        if self.closed:
+            return False
+        if lane != CONTROL_LANE and self.max_queued is not None and self.queued() >= self.max_queued:
+            if self.overflow == DROP_NEWEST:
+                self.count_drop()
+                return False
+            if self.overflow == DISCONNECT:
+                self.count_drop()
+                self.close()
+                asyncio.ensure_future(self.websocket.close(code=1008, reason="Too slow to keep up"))
+                return False
+            self.drop_oldest()
+
+        self.lanes[lane].append((encoded, started_at))
+        self.ready.set()
+        if self.metrics is not None:
+            self.metrics.message_queued(self.queued() + len(self.lanes[CONTROL_LANE]))
+        return True
+
+    def queued(self):
+        """Relay and bulk messages waiting (the ones max_queued applies to)"""
+        return sum(len(self.lanes[lane]) for lane in self.weighted_lanes)
+
+    def drop_oldest(self):
+        # Shed bulk before interactive relays
+        for lane in reversed(self.weighted_lanes):
+            if self.lanes[lane]:
+                self.lanes[lane].popleft()
+                self.count_drop()
+                self.unqueued(1)
+                return
+
+    def count_drop(self):
+        self.dropped += 1
+        if self.metrics is not None:
+            self.metrics.message_dropped(self.overflow)
+
+    def unqueued(self, count):
+        if self.metrics is not None and count:
+            self.metrics.messages_unqueued(count)
+
+    def depth(self):
+        return {lane: len(queue) for lane, queue in self.lanes.items()}
+
+    def next_message(self):
+        """Strict priority for control, then deficit round robin (in bytes) over the weighted lanes"""
+        control = self.lanes[CONTROL_LANE]
+        if control:
+            return (CONTROL_LANE,) + control.popleft()
+
+        if not any(self.lanes[lane] for lane in self.weighted_lanes):
+            return None, None, None
+
+        while True:
+            lane = self.weighted_lanes[self.turn]
+            queue = self.lanes[lane]
+            if queue and self.deficits[lane] >= len(queue[0][0]):
+                encoded, started_at = queue.popleft()
+                self.deficits[lane] -= len(encoded)
+                if not queue:
+                    self.deficits[lane] = 0
+                return lane, encoded, started_at
+
+            # This lane's turn is over; an idle lane doesn't bank credit
+            if not queue:
+                self.deficits[lane] = 0
+            self.turn = (self.turn + 1) % len(self.weighted_lanes)
+            next_lane = self.weighted_lanes[self.turn]
+            if self.lanes[next_lane]:
+                self.deficits[next_lane] += self.quantum * self.weights[next_lane]
+
+    async def run(self):
+        while True:
+            lane, encoded, started_at = self.next_message()
+            if encoded is None:
+                self.ready.clear()
+                await self.ready.wait()
+                continue
+
+            self.unqueued(1)
+            try:
+                await self.write(self.websocket, encoded, lane, started_at)
+            except Exception as e:
+                logger.error(f"Error writing to {self.websocket.remote_address}: {e}")
+
+    def close(self):
+        """Stop the writer and discard anything still queued"""
+        if self.closed:
+            return
+        self.closed = True
+        self.task.cancel()
+        self.unqueued(sum(len(queue) for queue in self.lanes.values()))
+        for queue in self.lanes.values():
+            queue.clear()
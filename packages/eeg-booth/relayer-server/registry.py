@@ -0,0 +1,75 @@
+"""
+Registry snapshots and paced admission for warm relayer restarts
+
+The relayer periodically writes its resumable booth sessions and scanner
+pairings to a local file and reloads them at startup. Booths then resume
+their sessions with their existing token, and scanners re-attach with their
+reconnect token, without a new handshake. New connections are admitted
+through a token bucket, so a reconnect storm after a deploy is spread out
+instead of hitting the new process all at once.
+"""
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+
+
+def write_snapshot(path, snapshot):
+    """Atomically replace the snapshot file (runs in a worker thread)"""
+    tmp_path = f'{path}.tmp'
+    # Session and reconnect tokens are bearer secrets: owner read/write only, whatever the umask
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    os.fchmod(fd, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        json.dump(snapshot, f)
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path, max_age):
+    """Load a snapshot written less than max_age seconds ago, or None"""
+    try:
+        with open(path, 'r') as f:
+            snapshot = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable registry snapshot {path}: {e}")
+        return None
+
+    if snapshot.get('version') != SNAPSHOT_VERSION:
+        logger.warning(f"Ignoring registry snapshot {path} with version {snapshot.get('version')}")
+        return None
+
+    age = time.time() - snapshot.get('saved_at', 0)
+    if age > max_age:
+        logger.info(f"Ignoring registry snapshot {path}: {age:.0f}s old, sessions have expired")
+        return None
+    return snapshot
+
+
+class AdmissionPacer:
+    """Token bucket that spaces out new connections instead of refusing them"""
+
+    def __init__(self, rate=100.0, burst=50, max_wait=10.0):
+        self.rate = rate
+        self.burst = burst
+        self.max_wait = max_wait
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def reserve(self):
+        """Seconds the caller must wait before it is admitted, or None if that is longer than max_wait"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        # Tokens go negative while callers are waiting, which queues them in arrival order
+        wait = max(0.0, (1 - self.tokens) / self.rate)
+        if wait > self.max_wait:
+            return None
+        self.tokens -= 1
+        return wait
@@ -4,15 +4,36 @@ import json
 import logging
 import ssl
 import os
+import secrets
+import sys
+import time
+from itertools import islice
 from typing import Dict, Set
 from datetime import datetime
+from batching import MessageBatcher
+from timer_wheel import TimerWheel
+from metrics import RelayerMetrics, MetricsHTTPServer
+from sessions import BoothSession
+from registry import AdmissionPacer, read_snapshot, write_snapshot, SNAPSHOT_VERSION
+from outbound import ConnectionWriter, classify, CONTROL_LANE, RELAY_LANE, OVERFLOW_POLICIES, DROP_OLDEST, DISCONNECT
+
+# Instrumentation shared with the booth backend lives in ../shared
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'shared'))
+from loop_monitor import start_loop_monitor_from_env
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class RelayerServer:
-    def __init__(self):
+    def __init__(self, batch_max_delay=0.003, batch_max_size=32,
+                 heartbeat_interval=20.0, idle_timeout=60.0, sweep_interval=1.0,
+                 max_connections=1000, max_connections_per_ip=20,
+                 resume_ttl=120.0, replay_buffer_size=256,
+                 bulk_threshold=16384, lane_weights=None, spectator_max_queued=256,
+                 send_queue_max=1024, send_queue_overflow=DROP_OLDEST,
+                 snapshot_path=None, snapshot_interval=5.0,
+                 admission_rate=100.0, admission_burst=50, admission_max_wait=10.0):
         # Store booth connections: booth_id -> websocket
         self.booth_connections: Dict[str, websockets.WebSocketServerProtocol] = {}
         
@@ -21,84 +42,412 @@ class RelayerServer:
         
         # Store all active connections for cleanup
         self.all_connections: Set[websockets.WebSocketServerProtocol] = set()
+        
+        # Outbound coalescers for clients that negotiated batching at registration
+        self.batchers: Dict[websockets.WebSocketServerProtocol, MessageBatcher] = {}
+        self.batch_max_delay = batch_max_delay
+        self.batch_max_size = batch_max_size
+        
+        # Liveness tracking: websocket -> monotonic time of last inbound traffic
+        self.last_seen: Dict[websockets.WebSocketServerProtocol, float] = {}
+        self.heartbeat_interval = heartbeat_interval
+        self.idle_timeout = idle_timeout
+        self.idle_wheel = TimerWheel(
+            tick_interval=sweep_interval,
+            slot_count=int(max(heartbeat_interval, idle_timeout) / sweep_interval) + 2
+        )
+        
+        # Connection limits
+        self.max_connections = max_connections
+        self.max_connections_per_ip = max_connections_per_ip
+        self.connections_per_ip: Dict[str, int] = {}
+        
+        # Incrementally maintained counters exposed over HTTP
+        self.metrics = RelayerMetrics()
+        self.connection_roles: Dict[websockets.WebSocketServerProtocol, str] = {}
+        
+        # Resumable booth sessions: booth_id -> BoothSession (kept for resume_ttl after a drop)
+        self.booth_sessions: Dict[str, BoothSession] = {}
+        self.resume_ttl = resume_ttl
+        self.replay_buffer_size = replay_buffer_size
+        
+        # Outbound lanes: websocket -> writer task draining control, relay and bulk queues
+        self.writers: Dict[websockets.WebSocketServerProtocol, ConnectionWriter] = {}
+        self.bulk_threshold = bulk_threshold
+        self.lane_weights = lane_weights
+        self.send_queue_max = send_queue_max
+        self.send_queue_overflow = send_queue_overflow
+        
+        # Read-only spectators: booth_id -> websockets watching it, and the reverse
+        self.spectators: Dict[str, Set[websockets.WebSocketServerProtocol]] = {}
+        self.spectator_booths: Dict[websockets.WebSocketServerProtocol, str] = {}
+        self.spectator_max_queued = spectator_max_queued
+        
+        # Scanner reconnect tokens: live scanner -> token, and pairings restored from a snapshot
+        # that wait for their scanner to come back: token -> (booth_id, expiry handle)
+        self.scanner_tokens: Dict[websockets.WebSocketServerProtocol, str] = {}
+        self.pending_scanners: Dict[str, tuple] = {}
+        
+        # Warm restarts: periodic registry snapshot and paced admission of the reconnect storm
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self.admission = AdmissionPacer(admission_rate, admission_burst, admission_max_wait) if admission_rate > 0 else None
+    
+    def set_role(self, websocket, role):
+        """Record a connection's role and keep the per-role counters in step"""
+        old_role = self.connection_roles.get(websocket)
+        if old_role is not None:
+            self.connection_roles[websocket] = role
+            self.metrics.role_changed(old_role, role)
+    
+    async def admit_connection(self, websocket):
+        """Enforce connection limits and start tracking liveness for a new client"""
+        ip = websocket.remote_address[0] if websocket.remote_address else 'unknown'
+        
+        if self.admission is not None:
+            delay = self.admission.reserve()
+            if delay is None:
+                logger.warning(f"Rejecting {ip}: admission queue is full")
+                self.metrics.connections_rejected += 1
+                self.metrics.error('admission_backlog')
+                await websocket.close(code=1013, reason="Server busy, try again shortly")
+                return False
+            if delay > 0:
+                self.metrics.admissions_delayed += 1
+                await asyncio.sleep(delay)
+        
+        if len(self.last_seen) >= self.max_connections:
+            logger.warning(f"Rejecting {ip}: connection limit {self.max_connections} reached")
+            self.metrics.connections_rejected += 1
+            self.metrics.error('connection_limit')
+            await websocket.close(code=1013, reason="Server connection limit reached")
+            return False
+        
+        if self.connections_per_ip.get(ip, 0) >= self.max_connections_per_ip:
+            logger.warning(f"Rejecting {ip}: per-IP limit {self.max_connections_per_ip} reached")
+            self.metrics.connections_rejected += 1
+            self.metrics.error('per_ip_limit')
+            await websocket.close(code=1013, reason="Too many connections from this address")
+            return False
+        
+        self.connections_per_ip[ip] = self.connections_per_ip.get(ip, 0) + 1
+        self.last_seen[websocket] = time.monotonic()
+        self.idle_wheel.schedule(websocket, self.heartbeat_interval)
+        self.connection_roles[websocket] = 'unregistered'
+        self.metrics.connection_opened('unregistered')
+        self.writers[websocket] = ConnectionWriter(
+            websocket,
+            self.write_frame,
+            self.lane_weights,
+            max_queued=self.send_queue_max,
+            overflow=self.send_queue_overflow,
+            metrics=self.metrics
+        )
+        return True
+    
+    def release_connection(self, websocket):
+        """Stop tracking a closed client and return its connection slot"""
+        self.idle_wheel.cancel(websocket)
+        self.last_seen.pop(websocket, None)
+        
+        role = self.connection_roles.pop(websocket, None)
+        if role is not None:
+            self.metrics.connection_closed(role)
+        
+        ip = websocket.remote_address[0] if websocket.remote_address else 'unknown'
+        remaining = self.connections_per_ip.get(ip, 0) - 1
+        if remaining > 0:
+            self.connections_per_ip[ip] = remaining
+        else:
+            self.connections_per_ip.pop(ip, None)
+    
+    async def sweep_idle_connections(self):
+        """Advance the idle wheel once per tick, pinging quiet peers and reaping dead ones"""
+        while True:
+            await asyncio.sleep(self.idle_wheel.tick_interval)
+            
+            for websocket in self.idle_wheel.advance():
+                last_seen = self.last_seen.get(websocket)
+                if last_seen is None:
+                    continue
+                
+                idle = time.monotonic() - last_seen
+                if idle >= self.idle_timeout:
+                    logger.info(f"Reaping idle connection from {websocket.remote_address} ({idle:.0f}s silent)")
+                    self.metrics.error('idle_timeout')
+                    # Closing can wait on a dead peer, so don't hold up the sweep
+                    asyncio.ensure_future(websocket.close(code=1001, reason="Idle timeout"))
+                elif idle >= self.heartbeat_interval:
+                    asyncio.ensure_future(self.send_heartbeat(websocket))
+                    self.idle_wheel.schedule(websocket, self.idle_timeout - idle)
+                else:
+                    # Traffic arrived since this entry was scheduled; check again later
+                    self.idle_wheel.schedule(websocket, self.heartbeat_interval - idle)
+    
+    async def send_heartbeat(self, websocket):
+        """Send a protocol-level ping and count the pong as activity"""
+        try:
+            pong_waiter = await websocket.ping()
+            await asyncio.wait_for(pong_waiter, timeout=self.idle_timeout)
+            if websocket in self.last_seen:
+                self.last_seen[websocket] = time.monotonic()
+        except (asyncio.TimeoutError, websockets.exceptions.ConnectionClosed):
+            pass
+    
+    async def negotiate_batching(self, websocket, data, confirmation):
+        """Send the registration confirmation, then enable batching if the client asked for it"""
+        wants_batching = bool(data.get('batching')) and self.batch_max_size > 1
+        
+        if wants_batching:
+            confirmation['batching'] = {
+                'enabled': True,
+                'max_delay_ms': self.batch_max_delay * 1000,
+                'max_batch_size': self.batch_max_size
+            }
+        
+        # The confirmation itself always goes out as a plain frame
+        await self.send_message(websocket, confirmation)
+        
+        if wants_batching and websocket not in self.batchers:
+            self.batchers[websocket] = MessageBatcher(
+                websocket,
+                max_delay=self.batch_max_delay,
+                max_batch_size=self.batch_max_size
+            )
     
     async def handle_booth_registration(self, websocket, data):
         """Handle booth registration with booth_id"""
         booth_id = data.get('booth_id')
         
         if not booth_id:
-            await self.send_error(websocket, "Missing booth_id in registration")
+            await self.send_error(websocket, "Missing booth_id in registration", 'missing_booth_id')
             return False
         
         # Store the booth connection
         self.booth_connections[booth_id] = websocket
         self.all_connections.add(websocket)
+        self.set_role(websocket, 'booth')
         
-        logger.info(f"Booth {booth_id} registered successfully")
-        
-        # Send confirmation
-        await self.send_message(websocket, {
+        confirmation = {
             'type': 'registration_success',
             'booth_id': booth_id,
             'timestamp': datetime.now().isoformat()
+        }
+        
+        if not data.get('resumable'):
+            logger.info(f"Booth {booth_id} registered successfully")
+            await self.negotiate_batching(websocket, data, confirmation)
+            return True
+        
+        # Resume the previous session if the booth presents its token, otherwise start a new one
+        session = self.booth_sessions.get(booth_id)
+        resumed = session is not None and session.matches(data.get('session_token'))
+        if not resumed:
+            if session:
+                session.cancel_expiry()
+            session = BoothSession(booth_id, replay_buffer_size=self.replay_buffer_size)
+            self.booth_sessions[booth_id] = session
+        
+        session.attach(websocket)
+        
+        # Dropping a sequenced message would leave a gap; disconnecting lets the booth resume and replay instead
+        writer = self.writers.get(websocket)
+        if writer is not None:
+            writer.overflow = DISCONNECT
+        
+        booth_last_seq = int(data.get('last_received_seq') or 0)
+        if resumed:
+            # A snapshot can predate messages the booth already saw; never reuse their seq numbers
+            session.next_seq = max(session.next_seq, booth_last_seq + 1)
+        session.acknowledge(booth_last_seq)
+        
+        confirmation.update({
+            'session_token': session.token,
+            'resumed': resumed,
+            'last_received_seq': session.last_received_seq,
+            # Explicit ack so the booth can trim its replay buffer before resending it
+            'ack': session.last_received_seq
         })
+        await self.negotiate_batching(websocket, data, confirmation)
+        
+        if resumed:
+            missed = session.pending_after(booth_last_seq)
+            for encoded in missed:
+                await self.send_encoded(websocket, encoded, RELAY_LANE)
+            logger.info(f"Booth {booth_id} resumed its session ({len(missed)} messages replayed)")
+        else:
+            logger.info(f"Booth {booth_id} registered successfully with a new session")
         
         return True
     
+    async def send_to_booth(self, booth_id, message, started_at=None):
+        """Send to a booth, sequencing and buffering the message if the booth has a session"""
+        session = self.booth_sessions.get(booth_id)
+        if session is None:
+            booth_websocket = self.booth_connections.get(booth_id)
+            if booth_websocket:
+                await self.send_message(booth_websocket, message, started_at)
+            return
+        
+        encoded = session.stamp(message)
+        if session.websocket is not None:
+            await self.send_encoded(session.websocket, encoded, RELAY_LANE, started_at)
+    
+    def booth_available(self, booth_id):
+        """A booth is available while connected or while its session awaits a resume"""
+        return booth_id in self.booth_connections or booth_id in self.booth_sessions
+    
+    async def notify_booth_gone(self, booth_id):
+        """Tell the booth's scanners and spectators it is gone for good"""
+        message = {
+            'type': 'booth_disconnected',
+            'booth_id': booth_id,
+            'timestamp': datetime.now().isoformat()
+        }
+        for scanner_ws, connected_booth_id in list(self.scanner_connections.items()):
+            if connected_booth_id == booth_id:
+                await self.send_message(scanner_ws, message)
+        await self.fan_out(booth_id, json.dumps(message), CONTROL_LANE)
+    
+    def expire_session(self, booth_id):
+        """Drop a suspended session once its resume window has passed"""
+        session = self.booth_sessions.get(booth_id)
+        if session is None or session.websocket is not None:
+            return
+        
+        del self.booth_sessions[booth_id]
+        logger.info(f"Session for booth {booth_id} expired")
+        asyncio.ensure_future(self.notify_booth_gone(booth_id))
+    
     async def handle_scanner_connection(self, websocket, data):
         """Handle scanner connection to a specific booth"""
         booth_id = data.get('booth_id')
         
         if not booth_id:
-            await self.send_error(websocket, "Missing booth_id for scanner connection")
+            await self.send_error(websocket, "Missing booth_id for scanner connection", 'missing_booth_id')
             return False
         
-        if booth_id not in self.booth_connections:
-            await self.send_error(websocket, f"Booth {booth_id} is not available")
+        if not self.booth_available(booth_id):
+            await self.send_error(websocket, f"Booth {booth_id} is not available", 'booth_unavailable')
             return False
         
         # Store scanner connection
         self.scanner_connections[websocket] = booth_id
         self.all_connections.add(websocket)
+        self.set_role(websocket, 'scanner')
+        
+        # A scanner paired before a relayer restart re-attaches quietly; the booth never saw it leave
+        token = data.get('reconnect_token')
+        pending = self.pending_scanners.get(token) if token else None
+        if pending is not None and pending[0] == booth_id:
+            del self.pending_scanners[token]
+            pending[1].cancel()
+            self.scanner_tokens[websocket] = token
+            logger.info(f"Scanner re-attached to booth {booth_id}")
+            
+            await self.negotiate_batching(websocket, data, {
+                'type': 'connection_success',
+                'booth_id': booth_id,
+                'reconnect_token': token,
+                'resumed': True,
+                'timestamp': datetime.now().isoformat()
+            })
+            return True
         
+        self.scanner_tokens[websocket] = secrets.token_urlsafe(24)
         logger.info(f"Scanner connected to booth {booth_id}")
         
         # Notify booth about scanner connection
-        booth_websocket = self.booth_connections[booth_id]
-        await self.send_message(booth_websocket, {
+        await self.send_to_booth(booth_id, {
             'type': 'scanner_connected',
             'booth_id': booth_id,
             'timestamp': datetime.now().isoformat()
         })
         
         # Confirm to scanner
-        await self.send_message(websocket, {
+        await self.negotiate_batching(websocket, data, {
             'type': 'connection_success',
             'booth_id': booth_id,
+            'reconnect_token': self.scanner_tokens[websocket],
+            'resumed': False,
             'timestamp': datetime.now().isoformat()
         })
         
         return True
     
+    async def handle_spectator_connection(self, websocket, data):
+        """Attach a read-only spectator to a booth's outbound messages"""
+        booth_id = data.get('booth_id')
+        
+        if not booth_id:
+            await self.send_error(websocket, "Missing booth_id for spectator", 'missing_booth_id')
+            return False
+        
+        if not self.booth_available(booth_id):
+            await self.send_error(websocket, f"Booth {booth_id} is not available", 'booth_unavailable')
+            return False
+        
+        drop_policy = data.get('drop_policy', DROP_OLDEST)
+        if drop_policy not in OVERFLOW_POLICIES:
+            await self.send_error(websocket, f"Unknown drop_policy {drop_policy}", 'invalid_drop_policy')
+            return False
+        
+        # A spectator that falls behind sheds messages (or is disconnected) rather than growing without bound
+        writer = self.writers.get(websocket)
+        if writer is not None:
+            writer.max_queued = self.spectator_max_queued
+            writer.overflow = drop_policy
+        
+        self.spectators.setdefault(booth_id, set()).add(websocket)
+        self.spectator_booths[websocket] = booth_id
+        self.all_connections.add(websocket)
+        self.set_role(websocket, 'spectator')
+        
+        logger.info(f"Spectator watching booth {booth_id} ({len(self.spectators[booth_id])} total)")
+        
+        await self.negotiate_batching(websocket, data, {
+            'type': 'spectate_success',
+            'booth_id': booth_id,
+            'drop_policy': drop_policy,
+            'max_queued': self.spectator_max_queued,
+            'timestamp': datetime.now().isoformat()
+        })
+        
+        return True
+    
+    def remove_spectator(self, websocket):
+        booth_id = self.spectator_booths.pop(websocket, None)
+        watchers = self.spectators.get(booth_id)
+        if watchers is not None:
+            watchers.discard(websocket)
+            if not watchers:
+                del self.spectators[booth_id]
+    
+    async def fan_out(self, booth_id, encoded, lane):
+        """Queue one already-encoded message for every spectator of a booth"""
+        for spectator_ws in self.spectators.get(booth_id, ()):
+            await self.send_encoded(spectator_ws, encoded, lane)
+    
     async def relay_message(self, sender_websocket, data):
         """Relay messages between scanner and booth"""
+        started_at = time.perf_counter()
         message_type = data.get('type')
         target = data.get('target')  # 'booth' or 'scanner'
         
         if sender_websocket in self.scanner_connections:
             # Message from scanner to booth
             booth_id = self.scanner_connections[sender_websocket]
-            if booth_id in self.booth_connections:
-                booth_websocket = self.booth_connections[booth_id]
-                await self.send_message(booth_websocket, {
+            if self.booth_available(booth_id):
+                await self.send_to_booth(booth_id, {
                     'type': 'message_from_scanner',
                     'data': data.get('data'),
                     'original_type': message_type,
                     'timestamp': datetime.now().isoformat()
-                })
+                }, started_at)
+                self.metrics.relay_completed()
                 logger.info(f"Relayed message from scanner to booth {booth_id}")
             else:
-                await self.send_error(sender_websocket, "Booth is no longer available")
+                await self.send_error(sender_websocket, "Booth is no longer available", 'booth_unavailable')
         
         elif sender_websocket in self.booth_connections.values():
             # Message from booth to scanner
@@ -108,6 +457,13 @@ class RelayerServer:
                     booth_id = bid
                     break
             
+            session = self.booth_sessions.get(booth_id)
+            if session is not None:
+                session.acknowledge(int(data.get('ack') or 0))
+                if not session.accept(data.get('seq')):
+                    # Already relayed before the booth reconnected and replayed it
+                    return
+            
             if booth_id:
                 # Find scanner connected to this booth
                 scanner_websocket = None
@@ -116,27 +472,67 @@ class RelayerServer:
                         scanner_websocket = scanner_ws
                         break
                 
-                if scanner_websocket:
-                    await self.send_message(scanner_websocket, {
+                watching = booth_id in self.spectators
+                if scanner_websocket or watching:
+                    # Encoded once for the scanner and every spectator
+                    encoded = json.dumps({
                         'type': 'message_from_booth',
                         'data': data.get('data'),
                         'original_type': message_type,
                         'booth_id': booth_id,
                         'timestamp': datetime.now().isoformat()
                     })
+                    lane = classify('message_from_booth', encoded, bulk_threshold=self.bulk_threshold)
+                    
+                    # Latency is timed to the scanner; spectators are best-effort and not measured
+                    if scanner_websocket:
+                        await self.send_encoded(scanner_websocket, encoded, lane, started_at)
+                    if watching:
+                        await self.fan_out(booth_id, encoded, lane)
+                    self.metrics.relay_completed()
                     logger.info(f"Relayed message from booth {booth_id} to scanner")
                 else:
-                    await self.send_error(sender_websocket, "No scanner connected")
+                    await self.send_error(sender_websocket, "No scanner connected", 'no_scanner')
+        
+        elif sender_websocket in self.spectator_booths:
+            await self.send_error(sender_websocket, "Spectators are read-only", 'read_only')
+    
+    async def send_message(self, websocket, message, started_at=None):
+        """Queue a JSON message on the connection's lane for its type and size"""
+        encoded = json.dumps(message)
+        lane = classify(message.get('type'), encoded, 'seq' in message, self.bulk_threshold)
+        await self.send_encoded(websocket, encoded, lane, started_at)
+    
+    async def send_encoded(self, websocket, encoded, lane=RELAY_LANE, started_at=None):
+        """Queue an already-encoded JSON message for the connection's writer"""
+        writer = self.writers.get(websocket)
+        if writer is not None:
+            writer.enqueue(lane, encoded, started_at)
+        else:
+            await self.write_frame(websocket, encoded, lane, started_at)
     
-    async def send_message(self, websocket, message):
-        """Send JSON message to websocket"""
+    async def write_frame(self, websocket, encoded, lane, started_at=None):
+        """Put one message on the wire, coalescing if the client negotiated batching"""
         try:
-            await websocket.send(json.dumps(message))
+            self.metrics.message_sent(encoded, lane)
+            
+            # Control messages skip the batch window; it would only delay them
+            batcher = self.batchers.get(websocket)
+            if batcher and lane != CONTROL_LANE:
+                await batcher.send(encoded)
+            else:
+                await websocket.send(encoded)
+            
+            # A relayed message's latency runs from receipt until here, queueing and the write included
+            if started_at is not None:
+                self.metrics.relay_delivered(started_at)
         except websockets.exceptions.ConnectionClosed:
+            self.metrics.error('send_to_closed')
             logger.warning("Attempted to send message to closed connection")
     
-    async def send_error(self, websocket, error_message):
+    async def send_error(self, websocket, error_message, error_type='error'):
         """Send error message to websocket"""
+        self.metrics.error(error_type)
         await self.send_message(websocket, {
             'type': 'error',
             'message': error_message,
@@ -148,6 +544,14 @@ class RelayerServer:
         # Remove from all connections
         self.all_connections.discard(websocket)
         
+        writer = self.writers.pop(websocket, None)
+        if writer:
+            writer.close()
+        
+        batcher = self.batchers.pop(websocket, None)
+        if batcher:
+            batcher.close()
+        
         # Check if it was a booth connection
         booth_to_remove = None
         for booth_id, ws in self.booth_connections.items():
@@ -157,27 +561,29 @@ class RelayerServer:
         
         if booth_to_remove:
             del self.booth_connections[booth_to_remove]
-            logger.info(f"Booth {booth_to_remove} disconnected")
             
-            # Notify any connected scanners
-            for scanner_ws, connected_booth_id in list(self.scanner_connections.items()):
-                if connected_booth_id == booth_to_remove:
-                    await self.send_message(scanner_ws, {
-                        'type': 'booth_disconnected',
-                        'booth_id': booth_to_remove,
-                        'timestamp': datetime.now().isoformat()
-                    })
+            session = self.booth_sessions.get(booth_to_remove)
+            if session is not None and session.websocket is websocket:
+                # Keep routing for the booth while it has a chance to resume
+                session.suspend(asyncio.get_running_loop(), self.resume_ttl, self.expire_session)
+                logger.info(f"Booth {booth_to_remove} disconnected; holding session for {self.resume_ttl:.0f}s")
+            else:
+                logger.info(f"Booth {booth_to_remove} disconnected")
+                await self.notify_booth_gone(booth_to_remove)
+        
+        if websocket in self.spectator_booths:
+            self.remove_spectator(websocket)
         
         # Check if it was a scanner connection
         if websocket in self.scanner_connections:
             booth_id = self.scanner_connections[websocket]
             del self.scanner_connections[websocket]
+            self.scanner_tokens.pop(websocket, None)
             logger.info(f"Scanner disconnected from booth {booth_id}")
             
             # Notify booth
-            if booth_id in self.booth_connections:
-                booth_websocket = self.booth_connections[booth_id]
-                await self.send_message(booth_websocket, {
+            if self.booth_available(booth_id):
+                await self.send_to_booth(booth_id, {
                     'type': 'scanner_disconnected',
                     'booth_id': booth_id,
                     'timestamp': datetime.now().isoformat()
@@ -187,8 +593,14 @@ class RelayerServer:
         """Handle new client connection"""
         logger.info(f"New client connected from {websocket.remote_address}")
         
+        if not await self.admit_connection(websocket):
+            return
+        
         try:
             async for message in websocket:
+                self.last_seen[websocket] = time.monotonic()
+                self.metrics.message_received(message)
+                
                 try:
                     data = json.loads(message)
                     message_type = data.get('type')
@@ -199,6 +611,9 @@ class RelayerServer:
                     elif message_type == 'connect_scanner':
                         await self.handle_scanner_connection(websocket, data)
                     
+                    elif message_type == 'spectate_booth':
+                        await self.handle_spectator_connection(websocket, data)
+                    
                     elif message_type == 'relay_message':
                         await self.relay_message(websocket, data)
                     
@@ -209,69 +624,229 @@ class RelayerServer:
                         })
                     
                     else:
-                        await self.send_error(websocket, f"Unknown message type: {message_type}")
+                        await self.send_error(websocket, f"Unknown message type: {message_type}", 'unknown_type')
                 
                 except json.JSONDecodeError:
-                    await self.send_error(websocket, "Invalid JSON message")
+                    await self.send_error(websocket, "Invalid JSON message", 'invalid_json')
                 except Exception as e:
                     logger.error(f"Error handling message: {e}")
-                    await self.send_error(websocket, "Internal server error")
+                    await self.send_error(websocket, "Internal server error", 'internal')
         
         except websockets.exceptions.ConnectionClosed:
             logger.info("Client disconnected")
         
         finally:
+            self.release_connection(websocket)
             await self.handle_disconnect(websocket)
     
+    def build_snapshot(self):
+        """Resumable booth sessions and scanner pairings, in the form restore_snapshot reads"""
+        scanners = [
+            {'token': token, 'booth_id': self.scanner_connections[websocket]}
+            for websocket, token in self.scanner_tokens.items()
+            if websocket in self.scanner_connections
+        ]
+        scanners.extend(
+            {'token': token, 'booth_id': booth_id}
+            for token, (booth_id, _) in self.pending_scanners.items()
+        )
+        
+        return {
+            'version': SNAPSHOT_VERSION,
+            'saved_at': time.time(),
+            'booth_sessions': [session.snapshot() for session in self.booth_sessions.values()],
+            'scanners': scanners
+        }
+    
+    async def snapshot_registry(self):
+        """Write a registry snapshot every snapshot_interval seconds"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.snapshot_interval)
+            try:
+                # Built on the loop so it is consistent; encoding and disk I/O happen off it
+                await loop.run_in_executor(None, write_snapshot, self.snapshot_path, self.build_snapshot())
+            except OSError as e:
+                logger.error(f"Failed to write registry snapshot: {e}")
+    
+    def restore_snapshot(self):
+        """Reload sessions and pairings saved by a previous process; they wait resume_ttl for their clients"""
+        snapshot = read_snapshot(self.snapshot_path, self.resume_ttl)
+        if snapshot is None:
+            return
+        
+        loop = asyncio.get_running_loop()
+        for data in snapshot['booth_sessions']:
+            session = BoothSession.from_snapshot(data, replay_buffer_size=self.replay_buffer_size)
+            session.suspend(loop, self.resume_ttl, self.expire_session)
+            self.booth_sessions[session.booth_id] = session
+        
+        for data in snapshot['scanners']:
+            if self.booth_available(data['booth_id']):
+                handle = loop.call_later(self.resume_ttl, self.expire_scanner, data['token'])
+                self.pending_scanners[data['token']] = (data['booth_id'], handle)
+        
+        logger.info(f"Restored {len(self.booth_sessions)} booth sessions and "
+                    f"{len(self.pending_scanners)} scanner pairings from {self.snapshot_path}")
+    
+    def expire_scanner(self, token):
+        """A restored scanner didn't come back in time; tell its booth"""
+        pending = self.pending_scanners.pop(token, None)
+        if pending is None:
+            return
+        
+        booth_id = pending[0]
+        if self.booth_available(booth_id):
+            asyncio.ensure_future(self.send_to_booth(booth_id, {
+                'type': 'scanner_disconnected',
+                'booth_id': booth_id,
+                'timestamp': datetime.now().isoformat()
+            }))
+    
     async def get_status(self):
-        """Get server status"""
+        """Get server status (constant time; use list_booths for booth ids)"""
         return {
             'active_booths': len(self.booth_connections),
             'active_scanners': len(self.scanner_connections),
             'total_connections': len(self.all_connections),
-            'booth_ids': list(self.booth_connections.keys())
+            'open_connections': len(self.last_seen),
+            'booth_sessions': len(self.booth_sessions),
+            'active_spectators': len(self.spectator_booths),
+            'scanners_awaiting_reattach': len(self.pending_scanners),
+            'relays_per_second': self.metrics.relay_rate.rate()
+        }
+    
+    def list_booths(self, offset=0, limit=50):
+        """Return one page of registered booths in registration order"""
+        now = time.monotonic()
+        page = []
+        for booth_id, websocket in islice(self.booth_connections.items(), offset, offset + limit):
+            last_seen = self.last_seen.get(websocket)
+            writer = self.writers.get(websocket)
+            page.append({
+                'booth_id': booth_id,
+                'remote_address': websocket.remote_address[0] if websocket.remote_address else None,
+                'idle_seconds': round(now - last_seen, 1) if last_seen is not None else None,
+                'send_queue': writer.depth() if writer else None,
+                'send_queue_dropped': writer.dropped if writer else 0
+            })
+        
+        return {
+            'total': len(self.booth_connections),
+            'offset': offset,
+            'limit': limit,
+            'booths': page
         }
 
 async def main():
-    relayer = RelayerServer()
-    
     # Configuration
     use_ssl = os.getenv('USE_SSL', 'false').lower() == 'true'
     port = int(os.getenv('PORT', '8765'))
+    batch_max_delay_ms = float(os.getenv('BATCH_MAX_DELAY_MS', '3'))
+    batch_max_size = int(os.getenv('BATCH_MAX_SIZE', '32'))
+    heartbeat_interval = float(os.getenv('HEARTBEAT_INTERVAL', '20'))
+    idle_timeout = float(os.getenv('IDLE_TIMEOUT', '60'))
+    max_connections = int(os.getenv('MAX_CONNECTIONS', '1000'))
+    max_connections_per_ip = int(os.getenv('MAX_CONNECTIONS_PER_IP', '20'))
+    metrics_port = int(os.getenv('METRICS_PORT', '8766'))
+    # Unauthenticated and lists booth ids and client IPs, so local-only unless asked otherwise
+    metrics_host = os.getenv('METRICS_HOST', '127.0.0.1')
+    resume_ttl = float(os.getenv('SESSION_RESUME_TTL', '120'))
+    replay_buffer_size = int(os.getenv('REPLAY_BUFFER_SIZE', '256'))
+    bulk_threshold = int(os.getenv('BULK_THRESHOLD_BYTES', '16384'))
+    spectator_max_queued = int(os.getenv('SPECTATOR_MAX_QUEUED', '256'))
+    send_queue_max = int(os.getenv('SEND_QUEUE_MAX', '1024'))
+    send_queue_overflow = os.getenv('SEND_QUEUE_OVERFLOW', DROP_OLDEST)
+    if send_queue_overflow not in OVERFLOW_POLICIES:
+        logger.error(f"SEND_QUEUE_OVERFLOW must be one of {', '.join(OVERFLOW_POLICIES)}")
+        return
+    snapshot_path = os.getenv('REGISTRY_SNAPSHOT_PATH', '')
+    snapshot_interval = float(os.getenv('REGISTRY_SNAPSHOT_INTERVAL', '5'))
+    admission_rate = float(os.getenv('ADMISSION_RATE', '100'))
+    admission_burst = int(os.getenv('ADMISSION_BURST', '50'))
+    admission_max_wait = float(os.getenv('ADMISSION_MAX_WAIT', '10'))
+    lane_weights = {
+        'relay': int(os.getenv('RELAY_LANE_WEIGHT', '4')),
+        'bulk': int(os.getenv('BULK_LANE_WEIGHT', '1'))
+    }
+    
+    relayer = RelayerServer(
+        batch_max_delay=batch_max_delay_ms / 1000,
+        batch_max_size=batch_max_size,
+        heartbeat_interval=heartbeat_interval,
+        idle_timeout=idle_timeout,
+        max_connections=max_connections,
+        max_connections_per_ip=max_connections_per_ip,
+        resume_ttl=resume_ttl,
+        replay_buffer_size=replay_buffer_size,
+        bulk_threshold=bulk_threshold,
+        lane_weights=lane_weights,
+        spectator_max_queued=spectator_max_queued,
+        send_queue_max=send_queue_max,
+        send_queue_overflow=send_queue_overflow,
+        snapshot_path=snapshot_path,
+        snapshot_interval=snapshot_interval,
+        admission_rate=admission_rate,
+        admission_burst=admission_burst,
+        admission_max_wait=admission_max_wait
+    )
     cert_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'certificates')
     
     # Start the server with proper handler signature for websockets 11+
     async def connection_handler(websocket):
         await relayer.handle_client(websocket)
     
-    if use_ssl:
-        # SSL Configuration
-        ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
-        cert_file = os.path.join(cert_dir, 'relayer-certificate.pem')
-        key_file = os.path.join(cert_dir, 'relayer-private-key.pem')
-        
-        if not os.path.exists(cert_file) or not os.path.exists(key_file):
-            logger.error(f"SSL certificates not found in {cert_dir}")
-            logger.error("Run ./create-certificates.sh to generate certificates")
-            return
-        
-        ssl_context.load_cert_chain(cert_file, key_file)
-        
-        logger.info(f"Starting WebSocket Relayer Server with SSL on port {port}")
-        logger.info(f"Using certificates from: {cert_dir}")
-        
-        async with websockets.serve(connection_handler, "0.0.0.0", port, ssl=ssl_context):
-            logger.info("Secure WebSocket Relayer Server (WSS) is running...")
-            # Keep the server running
-            await asyncio.Future()  # Run forever
-    else:
-        logger.info(f"Starting WebSocket Relayer Server on port {port}")
-        logger.info("Note: Using unsecured WebSocket (WS). Set USE_SSL=true for secure connections.")
-        
-        async with websockets.serve(connection_handler, "0.0.0.0", port):
-            logger.info("WebSocket Relayer Server is running...")
-            # Keep the server running
-            await asyncio.Future()  # Run forever
+    # Opt-in loop lag / slow callback profiling (LOOP_MONITOR=true)
+    start_loop_monitor_from_env('relayer')
+    
+    # Read-only HTTP metrics on the same event loop (METRICS_PORT=0 disables it)
+    if metrics_port:
+        await MetricsHTTPServer(relayer, host=metrics_host, port=metrics_port).start()
+        asyncio.create_task(relayer.metrics.monitor_loop_lag())
+    
+    # Warm restart: pick up sessions saved by the previous process (opt-in via REGISTRY_SNAPSHOT_PATH)
+    if snapshot_path:
+        relayer.restore_snapshot()
+        asyncio.create_task(relayer.snapshot_registry())
+    
+    try:
+        if use_ssl:
+            # SSL Configuration
+            ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            cert_file = os.path.join(cert_dir, 'relayer-certificate.pem')
+            key_file = os.path.join(cert_dir, 'relayer-private-key.pem')
+            
+            if not os.path.exists(cert_file) or not os.path.exists(key_file):
+                logger.error(f"SSL certificates not found in {cert_dir}")
+                logger.error("Run ./create-certificates.sh to generate certificates")
+                return
+            
+            ssl_context.load_cert_chain(cert_file, key_file)
+            
+            logger.info(f"Starting WebSocket Relayer Server with SSL on port {port}")
+            logger.info(f"Using certificates from: {cert_dir}")
+            
+            # Keep-alive pings are driven by the relayer's own idle sweeper
+            async with websockets.serve(connection_handler, "0.0.0.0", port, ssl=ssl_context, ping_interval=None):
+                asyncio.create_task(relayer.sweep_idle_connections())
+                logger.info("Secure WebSocket Relayer Server (WSS) is running...")
+                # Keep the server running
+                await asyncio.Future()  # Run forever
+        else:
+            logger.info(f"Starting WebSocket Relayer Server on port {port}")
+            logger.info("Note: Using unsecured WebSocket (WS). Set USE_SSL=true for secure connections.")
+            
+            # Keep-alive pings are driven by the relayer's own idle sweeper
+            async with websockets.serve(connection_handler, "0.0.0.0", port, ping_interval=None):
+                asyncio.create_task(relayer.sweep_idle_connections())
+                logger.info("WebSocket Relayer Server is running...")
+                # Keep the server running
+                await asyncio.Future()  # Run forever
+    finally:
+        # Final snapshot so a clean shutdown loses nothing since the last periodic one
+        if snapshot_path:
+            write_snapshot(snapshot_path, relayer.build_snapshot())
+
 
 if __name__ == "__main__":
     try:
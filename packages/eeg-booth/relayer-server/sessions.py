@@ -0,0 +1,93 @@
+"""
+Resumable booth sessions for the relayer
+
+A booth that registers with `resumable: true` gets a session token. Messages
+the relayer sends to that booth are sequence-numbered and kept in a bounded
+replay buffer, so after a network blip the booth can re-register with its
+token and the last sequence number it saw, and receive everything it missed.
+"""
+import json
+import secrets
+from collections import deque
+
+
+class BoothSession:
+    """Relayer-side state for one resumable booth registration"""
+
+    def __init__(self, booth_id, replay_buffer_size=256):
+        self.booth_id = booth_id
+        self.token = secrets.token_urlsafe(24)
+        self.websocket = None
+        self.expiry_handle = None
+
+        # Outbound (relayer -> booth) messages awaiting acknowledgement
+        self.replay_buffer = deque(maxlen=replay_buffer_size)
+        self.next_seq = 1
+
+        # Highest booth -> relayer sequence number processed
+        self.last_received_seq = 0
+
+    def snapshot(self):
+        """JSON-ready state for a registry snapshot; the connection itself can't be saved"""
+        return {
+            'booth_id': self.booth_id,
+            'token': self.token,
+            'next_seq': self.next_seq,
+            'last_received_seq': self.last_received_seq,
+            'replay_buffer': list(self.replay_buffer)
+        }
+
+    @classmethod
+    def from_snapshot(cls, data, replay_buffer_size=256):
+        """Rebuild a detached session from snapshot(); the booth resumes it with the same token"""
+        session = cls(data['booth_id'], replay_buffer_size=replay_buffer_size)
+        session.token = data['token']
+        session.next_seq = data['next_seq']
+        session.last_received_seq = data['last_received_seq']
+        session.replay_buffer.extend((seq, encoded) for seq, encoded in data['replay_buffer'])
+        return session
+
+    def matches(self, token):
+        return bool(token) and secrets.compare_digest(str(token), self.token)
+
+    def stamp(self, message):
+        """Assign the next sequence number, buffer the message and return it encoded"""
+        message['seq'] = self.next_seq
+        message['ack'] = self.last_received_seq
+        self.next_seq += 1
+
+        encoded = json.dumps(message)
+        self.replay_buffer.append((message['seq'], encoded))
+        return encoded
+
+    def acknowledge(self, seq):
+        """Drop buffered messages the booth has confirmed receiving"""
+        while self.replay_buffer and self.replay_buffer[0][0] <= seq:
+            self.replay_buffer.popleft()
+
+    def accept(self, seq):
+        """Record an inbound sequence number; False means it is a replayed duplicate"""
+        if seq is None:
+            return True
+        if seq <= self.last_received_seq:
+            return False
+        self.last_received_seq = seq
+        return True
+
+    def pending_after(self, seq):
+        """Encoded messages the booth has not seen yet, in order"""
+        return [encoded for message_seq, encoded in self.replay_buffer if message_seq > seq]
+
+    def suspend(self, loop, ttl, on_expire):
+        self.websocket = None
+        self.cancel_expiry()
+        self.expiry_handle = loop.call_later(ttl, on_expire, self.booth_id)
+
+    def attach(self, websocket):
+        self.cancel_expiry()
+        self.websocket = websocket
+
+    def cancel_expiry(self):
+        if self.expiry_handle is not None:
+            self.expiry_handle.cancel()
+            self.expiry_handle = None
@@ -0,0 +1,59 @@
+"""
+Hashed timer wheel for connection housekeeping
+
+Scheduling and cancelling a key are O(1), and each tick only inspects the
+entries hashed into the current slot, so periodic sweeps stay cheap no matter
+how many connections are open.
+"""
+import math
+
+
+class TimerWheel:
+    """Fixed-resolution timer wheel keyed by arbitrary hashable objects"""
+
+    def __init__(self, tick_interval=1.0, slot_count=64):
+        self.tick_interval = tick_interval
+        # Each slot maps key -> remaining full rotations before it fires
+        self.slots = [{} for _ in range(slot_count)]
+        self.cursor = 0
+        self.positions = {}
+
+    def schedule(self, key, delay):
+        """(Re)schedule key to expire after roughly `delay` seconds"""
+        self.cancel(key)
+
+        slot_count = len(self.slots)
+        ticks = max(1, math.ceil(delay / self.tick_interval))
+        slot_index = (self.cursor + ticks) % slot_count
+        rounds = (ticks - 1) // slot_count
+
+        self.slots[slot_index][key] = rounds
+        self.positions[key] = slot_index
+
+    def cancel(self, key):
+        """Remove key from the wheel if it is scheduled"""
+        slot_index = self.positions.pop(key, None)
+        if slot_index is not None:
+            self.slots[slot_index].pop(key, None)
+
+    def advance(self):
+        """Move one tick forward and return the keys that expired"""
+        self.cursor = (self.cursor + 1) % len(self.slots)
+        slot = self.slots[self.cursor]
+
+        expired = []
+        for key, rounds in list(slot.items()):
+            if rounds == 0:
+                expired.append(key)
+                del slot[key]
+                del self.positions[key]
+            else:
+                slot[key] = rounds - 1
+
+        return expired
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __contains__(self, key):
+        return key in self.positions
@@ -0,0 +1,167 @@
+"""
+Opt-in event-loop lag and slow-callback profiler
+
+Shared by the relayer and the booth backend. A probe task measures how late
+the loop wakes up, and a watchdog thread captures the loop thread's stack
+whenever the loop has been blocked for longer than the slow threshold, so a
+stalled stream can be traced back to the synchronous code that caused it.
+
+Enable with LOOP_MONITOR=true. Tuning:
+    LOOP_MONITOR_SLOW_MS       stall threshold in milliseconds (default 100)
+    LOOP_MONITOR_INTERVAL_MS   probe interval in milliseconds (default 100)
+    LOOP_MONITOR_SUMMARY_S     seconds between summary log lines (default 60)
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+
+logger = logging.getLogger(__name__)
+
+
+class LoopMonitor:
+    """Measures loop lag percentiles and samples stacks of callbacks that block the loop"""
+
+    def __init__(self, name, probe_interval=0.1, slow_threshold=0.1, summary_interval=60.0,
+                 max_samples=2048, max_slow_events=50, stack_depth=12):
+        self.name = name
+        self.probe_interval = probe_interval
+        self.slow_threshold = slow_threshold
+        self.summary_interval = summary_interval
+        self.stack_depth = stack_depth
+
+        self.lag_samples = deque(maxlen=max_samples)
+        self.slow_events = deque(maxlen=max_slow_events)
+        self.slow_event_count = 0
+
+        self.loop = None
+        self.loop_thread_id = None
+        self.last_wakeup = time.monotonic()
+        self.pending_stall = None
+        self.running = False
+        self.tasks = []
+
+    def start(self):
+        """Start probing the running event loop; call from inside that loop"""
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread_id = threading.get_ident()
+        self.last_wakeup = time.monotonic()
+        self.running = True
+
+        self.tasks = [
+            asyncio.create_task(self.probe_lag()),
+            asyncio.create_task(self.log_summaries())
+        ]
+        threading.Thread(target=self.watch_for_stalls, name=f"{self.name}-loop-watchdog", daemon=True).start()
+
+        logger.info(f"Loop monitor '{self.name}' enabled (slow threshold {self.slow_threshold * 1000:.0f} ms)")
+        return self
+
+    def stop(self):
+        self.running = False
+        for task in self.tasks:
+            task.cancel()
+
+    async def probe_lag(self):
+        while self.running:
+            expected = self.loop.time() + self.probe_interval
+            await asyncio.sleep(self.probe_interval)
+            lag = max(0.0, self.loop.time() - expected)
+
+            self.lag_samples.append(lag)
+            self.last_wakeup = time.monotonic()
+
+            # The watchdog saw this stall in progress; record how long it really lasted
+            stall = self.pending_stall
+            if stall is not None:
+                stall['duration_ms'] = round(lag * 1000, 1)
+                self.pending_stall = None
+
+    def watch_for_stalls(self):
+        """Watchdog thread: sample the loop thread's stack while the loop is blocked"""
+        check_interval = max(self.slow_threshold / 2, 0.01)
+        sampled_wakeup = None
+
+        while self.running:
+            time.sleep(check_interval)
+
+            blocked_for = time.monotonic() - self.last_wakeup - self.probe_interval
+            if blocked_for < self.slow_threshold or sampled_wakeup == self.last_wakeup:
+                continue
+
+            # One stack sample per stall is enough to identify the culprit
+            sampled_wakeup = self.last_wakeup
+            frame = sys._current_frames().get(self.loop_thread_id)
+            if frame is None:
+                continue
+
+            stack = traceback.format_stack(frame, limit=self.stack_depth)
+            stall = {
+                'at': time.time(),
+                'blocked_ms_at_sample': round(blocked_for * 1000, 1),
+                'duration_ms': None,
+                'stack': [line.rstrip() for line in stack]
+            }
+            self.slow_events.append(stall)
+            self.slow_event_count += 1
+            self.pending_stall = stall
+
+            logger.warning(
+                f"[{self.name}] event loop blocked for {blocked_for * 1000:.0f} ms at:\n{''.join(stack[-3:]).rstrip()}"
+            )
+
+    def percentiles(self):
+        samples = sorted(self.lag_samples)
+        if not samples:
+            return {'p50': 0.0, 'p90': 0.0, 'p99': 0.0, 'max': 0.0}
+
+        def at(q):
+            return round(samples[min(len(samples) - 1, int(q * len(samples)))] * 1000, 2)
+
+        return {'p50': at(0.5), 'p90': at(0.9), 'p99': at(0.99), 'max': round(samples[-1] * 1000, 2)}
+
+    def summary(self):
+        """Lag percentiles (ms) and the most frequent blocking call sites"""
+        call_sites = Counter(event['stack'][-1].strip().splitlines()[0] for event in self.slow_events if event['stack'])
+        return {
+            'name': self.name,
+            'lag_ms': self.percentiles(),
+            'samples': len(self.lag_samples),
+            'slow_callbacks': self.slow_event_count,
+            'top_call_sites': call_sites.most_common(5),
+            'recent_stalls': list(self.slow_events)[-5:]
+        }
+
+    async def log_summaries(self):
+        while self.running:
+            await asyncio.sleep(self.summary_interval)
+            summary = self.summary()
+            lag = summary['lag_ms']
+            logger.info(
+                f"[{self.name}] loop lag p50={lag['p50']}ms p90={lag['p90']}ms p99={lag['p99']}ms "
+                f"max={lag['max']}ms, slow callbacks={summary['slow_callbacks']}"
+            )
+            for call_site, count in summary['top_call_sites']:
+                logger.info(f"[{self.name}]   {count}x {call_site}")
+
+            # Each summary covers one interval
+            self.lag_samples.clear()
+            self.slow_events.clear()
+            self.slow_event_count = 0
+
+
+def start_loop_monitor_from_env(name):
+    """Start a LoopMonitor on the running loop if LOOP_MONITOR=true, otherwise return None"""
+    if os.getenv('LOOP_MONITOR', 'false').lower() != 'true':
+        return None
+
+    return LoopMonitor(
+        name,
+        probe_interval=float(os.getenv('LOOP_MONITOR_INTERVAL_MS', '100')) / 1000,
+        slow_threshold=float(os.getenv('LOOP_MONITOR_SLOW_MS', '100')) / 1000,
+        summary_interval=float(os.getenv('LOOP_MONITOR_SUMMARY_S', '60'))
+    ).start()